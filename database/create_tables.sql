@@ -24,3 +24,13 @@ CREATE TABLE IF NOT EXISTS texts
     punct_array     integer[],
     code_name       text NULL UNIQUE
 );
+
+-- Частеречевые N-граммы текстов в разреженном виде: только N-граммы, встреченные в тексте
+CREATE TABLE IF NOT EXISTS text_ngramms
+(
+    text_id         integer NOT NULL REFERENCES texts (id),  -- FK
+    ngramm_order    text NOT NULL,                           -- порядок N-грамм: '3', '2s1', ...
+    ngramm_id       integer NOT NULL,                        -- номер N-граммы в общем словаре порядка
+    count           integer NOT NULL,
+    PRIMARY KEY (text_id, ngramm_order, ngramm_id)
+);
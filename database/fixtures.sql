@@ -12,3 +12,10 @@ UPDATE texts SET author_id = 5 where id = 8;
 
 ALTER TABLE texts ALTER COLUMN author_id DROP DEFAULT;
 ALTER TABLE texts ADD FOREIGN KEY(author_id) REFERENCES authors(id);
+
+-- Размер словаря N-грамм, по которому построена запись: при чтении вектор
+-- дополняется нулями до размера текущего словаря, и старые записи не переписываются
+
+ALTER TABLE texts ADD COLUMN ngramms_size integer NULL;
+
+UPDATE texts SET ngramms_size = coalesce(array_length(ngramms_array, 1), 0) WHERE ngramms_size IS NULL;
@@ -0,0 +1,317 @@
+# coding: utf-8
+"""
+Замеры производительности этапов обработки текста Harold
+
+    $ python benchmark.py ../examples/fb2/kolokol.fb2
+
+Каждый замер сравнивает прежнюю реализацию этапа с текущей на одном и том же тексте
+и проверяет, что результаты совпадают
+"""
+import sys
+import time
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import hashlib
+import cPickle as pickle
+import nltk
+from multiprocessing import Pool
+from config.settings import CUSTOM_PUNCTUATION_SYMBOLS
+from nlp.text_processor import TextProcessor, cleaning_rules_version
+from nlp.morphology import PosCache, get_morph_analyzer
+from nlp.speech_parts import SpeechParts
+from nlp.ngramms import HAS_NUMPY, count_ngramms, order_name
+from nlp.punctuation import get_punctuation_engine
+from nlp.tokenizers import get_tokenizer, BACKENDS, LANGUAGE
+from nlp.vocabulary import Vocabulary
+from nlp.vocabulary_store import VocabularyStore
+
+
+def _measure(func, repeat=3):
+    """Лучшее время из repeat запусков и результат последнего запуска"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        ts = time.time()
+        result = func()
+        te = time.time()
+        if best is None or te - ts < best:
+            best = te - ts
+    return best, result
+
+
+def pos_tagging(filename):
+    """Определение частей речи: каждое слово текста против уникальных словоформ"""
+    tp = TextProcessor(filename, stream=True)
+    tp._clean_and_tokenize()
+    get_morph_analyzer()
+
+    def run(strategy):
+        def _run():
+            tp.speech_parts = SpeechParts()
+            tp._pos = {}
+            # Новый кэш без лексикона - замеряется сам этап, а не прогретый кэш
+            conflicts = tp._define_part_of_speech(strategy, morph=PosCache(get_morph_analyzer()))
+            return tp.speech_parts, dict(tp.pos), conflicts
+        return _run
+
+    tokens_time, tokens_result = _measure(run('tokens'))
+    vocabulary_time, vocabulary_result = _measure(run('vocabulary'))
+
+    print "[POS tagging] {words} words, {sent} sentences".format(words=tp.words_count, sent=tp.sentences_count)
+    print "\ttokens:     {:.3f} s".format(tokens_time)
+    print "\tvocabulary: {:.3f} s".format(vocabulary_time)
+    print "\tspeedup:    {:.1f}x, same result: {}".format(tokens_time / vocabulary_time,
+                                                          tokens_result == vocabulary_result)
+
+
+def _legacy_punctuation(sentences, counts):
+    """Прежний разбор пунктуации: проверка токена по словарю и посимвольный проход по слову"""
+    words = []
+    for tokens in sentences:
+        for token in tokens:
+            if token in counts:
+                counts[token] += 1
+            else:
+                _clean_word = ''
+                for symbol in token:
+                    if symbol not in CUSTOM_PUNCTUATION_SYMBOLS:
+                        _clean_word += symbol
+                    else:
+                        counts[symbol] += 1
+                words.append(_clean_word)
+    return words, counts
+
+
+def _engine_punctuation(sentences, engine):
+    counts = engine.new_counts()
+    words = []
+    for tokens in sentences:
+        words.extend(engine.split(tokens, counts))
+    return words, counts
+
+
+def punctuation(filename):
+    """Разбор пунктуации на этапе токенизации: посимвольный проход против PunctuationEngine
+
+    Токены nltk получаются заранее, замеряется только обработка пунктуации
+    """
+    tp = TextProcessor(filename, stream=True)
+    tp._clean_and_tokenize()
+    sentences = [tp.tokenizer.words(sentence) for sentence in tp.sentences]
+    engine = get_punctuation_engine()
+
+    legacy_time, (legacy_words, legacy_counts) = _measure(
+        lambda: _legacy_punctuation(sentences, engine.new_counts()))
+    engine_time, (engine_words, engine_counts) = _measure(lambda: _engine_punctuation(sentences, engine))
+
+    # Многосимвольные знаки ('..', '***') прежний разбор внутри слов не находил
+    differences = sum(1 for old, new in zip(legacy_words, engine_words) if old != new)
+    print "[Punctuation] {tokens} tokens".format(tokens=sum(len(tokens) for tokens in sentences))
+    print "\tlegacy: {:.3f} s".format(legacy_time)
+    print "\tengine: {:.3f} s".format(engine_time)
+    print "\tspeedup: {:.1f}x, same counts: {}, words with multi-character symbols: {}".format(
+        legacy_time / engine_time, dict(legacy_counts) == dict(engine_counts), differences)
+
+
+def tokenizers(filename):
+    """Разбор предложений на токены: скорость всех токенизаторов и совпадение с эталоном 'nltk'
+
+    Сам эталон сверяется с nltk.word_tokenize: обертка над nltk не должна менять результат
+    """
+    tp = TextProcessor(filename, stream=True)
+    tp._clean_and_tokenize()
+    reference = get_tokenizer('nltk')
+    expected = [reference.words(sentence) for sentence in tp.sentences]
+    tokens = sum(len(words) for words in expected)
+
+    print "[Tokenizers] {tokens} tokens, {sent} sentences".format(tokens=tokens, sent=tp.sentences_count)
+    drift = [s for s in range(len(expected)) if expected[s] != nltk.word_tokenize(tp.sentences[s], LANGUAGE)]
+    print "\tnltk backend vs nltk.word_tokenize, different sentences: {diff}".format(diff=len(drift))
+    for s in drift[:5]:
+        print "\t\t{sentence}".format(sentence=tp.sentences[s].encode('utf-8'))
+    if drift:
+        raise AssertionError('nltk tokenizer backend differs from nltk.word_tokenize')
+    for backend in sorted(BACKENDS):
+        tokenizer = get_tokenizer(backend)
+        backend_time, result = _measure(lambda: [tokenizer.words(sentence) for sentence in tp.sentences])
+        mismatches = [s for s in range(len(expected)) if result[s] != expected[s]]
+        print "\t{backend}: {time:.3f} s, {speed:.0f} tokens/s, sentences different from nltk: {diff}".format(
+            backend=backend, time=backend_time, speed=tokens / backend_time, diff=len(mismatches))
+        for s in mismatches[:5]:
+            print "\t\t{sentence}".format(sentence=tp.sentences[s].encode('utf-8'))
+
+
+# Порядки для замера многопорядкового подсчета: 2-5-граммы и skip-граммы
+BENCHMARK_ORDERS = [(2, 0), (3, 0), (4, 0), (5, 0), (2, 1), (3, 1)]
+
+
+def ngramms(filename, copies=10, orders=BENCHMARK_ORDERS):
+    """Подсчет N-грамм: строки по предложениям против числовых кодов NumPy
+
+    Триграммы замеряются на самом тексте и на тексте, повторенном copies раз.
+    Порядки orders считаются за один проход и отдельным вызовом на каждый порядок
+    """
+    tp = TextProcessor(filename, stream=True)
+    tp._clean_and_tokenize()
+    tp._define_part_of_speech()
+    speech_parts = tp.speech_parts
+
+    for n in (1, copies):
+        tp.speech_parts = SpeechParts()
+        for _ in range(n):
+            tp.speech_parts.extend(speech_parts)
+
+        sentences_time, sentences_result = _measure(lambda: tp._count_ngramms_by_sentences([(3, 0)]))
+        numpy_time, numpy_result = _measure(lambda: count_ngramms(tp.speech_parts, [(3, 0)]))
+
+        print "[N-gramms] {words} words, {n} unique trigramms".format(words=len(tp.speech_parts.codes),
+                                                                     n=len(numpy_result[(3, 0)]))
+        print "\tsentences: {:.3f} s".format(sentences_time)
+        print "\tnumpy:     {:.3f} s".format(numpy_time)
+        print "\tspeedup:   {:.1f}x, same result: {}".format(sentences_time / numpy_time,
+                                                           sentences_result == numpy_result)
+
+    sentences_time, sentences_result = _measure(lambda: tp._count_ngramms_by_sentences(orders))
+    single_time, single_result = _measure(lambda: count_ngramms(tp.speech_parts, orders))
+    separate_time, separate_result = _measure(
+        lambda: dict(item for order in orders for item in count_ngramms(tp.speech_parts, [order]).iteritems()))
+
+    print "[N-gramms] {words} words, orders: {orders}".format(words=len(tp.speech_parts.codes),
+                                                             orders=', '.join(order_name(order) for order in orders))
+    print "\tsentences:         {:.3f} s".format(sentences_time)
+    print "\tnumpy, one pass:   {:.3f} s".format(single_time)
+    print "\tnumpy, per order:  {:.3f} s".format(separate_time)
+    print "\tsame result: {}".format(sentences_result == single_result == separate_result)
+
+    # Тексты короче окна N-граммы, в том числе для skip-грамм с большим пропуском
+    short_orders = orders + [(3, 3)]
+    same = True
+    for sentences in ([], [[u'NOUN'] * 7], [[u'NOUN', u'VERB'], [u'ADJF'] * 9]):
+        tp.speech_parts = SpeechParts.from_lists(sentences)
+        same = same and tp._count_ngramms_by_sentences(short_orders) == count_ngramms(tp.speech_parts, short_orders)
+    print "[N-gramms] texts shorter than the window, same result: {}".format(same)
+
+
+def _fill_store(args):
+    """Процесс-писатель: несколько раз пополняет словарь и сохраняет его"""
+    filename, seed, books, compaction = args
+    rnd = random.Random(seed)
+    store = VocabularyStore(filename, compaction)
+    vocabulary = store.load()
+    for _ in range(books):
+        for _ in range(200):
+            vocabulary.add(u'NG{}'.format(rnd.randint(0, 20000)))
+        store.save()
+    return vocabulary.items
+
+
+def vocabulary_store(writers=4, books=20, size=200000):
+    """Общий словарь N-грамм: перезапись всего pickle-файла против дописывания журнала
+
+    Кроме того, writers процессов одновременно пополняют один словарь: номера N-грамм
+    каждого процесса должны совпасть с итоговым словарем на диске
+    """
+    folder = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(folder, 'ngramm.pkl')
+        vocabulary = Vocabulary(u'NG{}'.format(i) for i in range(size))
+
+        def rewrite():
+            output = open(filename + '.old', 'wb')
+            pickle.dump(vocabulary, output, 2)
+            output.close()
+
+        store = VocabularyStore(filename, compaction=size)
+        store.load()
+        store.vocabulary.items, store.vocabulary.index = vocabulary.items, vocabulary.index
+        store.save()
+
+        def append():
+            for i in range(100):
+                store.vocabulary.add(u'NEW{}-{}'.format(len(store.vocabulary), i))
+            store.save()
+
+        rewrite_time, _ = _measure(rewrite)
+        append_time, _ = _measure(append)
+        print "[Vocabulary] {n} N-gramms, 100 new per save".format(n=size)
+        print "\tfull rewrite: {:.4f} s".format(rewrite_time)
+        print "\tlog append:   {:.4f} s".format(append_time)
+
+        filename = os.path.join(folder, 'ngramm_concurrent.pkl')
+        pool = Pool(processes=writers)
+        try:
+            results = pool.map(_fill_store, [(filename, seed, books, 500) for seed in range(writers)])
+        finally:
+            pool.close()
+            pool.join()
+
+        final = VocabularyStore(filename).load().items
+        consistent = all(final[:len(items)] == items for items in results)
+        print "[Vocabulary] {writers} concurrent writers: {n} N-gramms, unique: {unique}, " \
+              "ids consistent: {consistent}".format(writers=writers, n=len(final),
+                                                    unique=len(set(final)) == len(final), consistent=consistent)
+    finally:
+        shutil.rmtree(folder)
+
+
+# Изменение извлечения текста для проверки кэша: фрагменты тегов приводятся к верхнему регистру
+_EXTRACTION_CHANGE = ('yield self.root.text.strip()', 'yield self.root.text.strip().upper()')
+
+_EXTRACTION_SCRIPT = '''
+import sys, hashlib
+from parser.sources import open_text_source
+from nlp.text_processor import cleaning_rules_version
+text = u'\\n'.join(open_text_source(sys.argv[1]).iter_paragraphs())
+print cleaning_rules_version(), hashlib.sha256(text.encode('utf-8')).hexdigest()
+'''
+
+
+def text_cache(filename):
+    """Кэш очищенных текстов: изменение извлечения текста из источника должно менять версию кэша
+
+    Пакет parser копируется во временную папку, в копии меняется извлечение текста,
+    и версия кэша вычисляется в отдельном процессе с этой копией
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    text = u'\n'.join(TextProcessor(filename).file.iter_paragraphs())
+    expected = cleaning_rules_version(), hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    folder = tempfile.mkdtemp()
+    try:
+        shutil.copytree(os.path.join(root, 'parser'), os.path.join(folder, 'parser'),
+                        ignore=shutil.ignore_patterns('*.pyc'))
+        body = os.path.join(folder, 'parser', 'pyfb2', 'body.py')
+        with open(body) as f:
+            source = f.read()
+        with open(body, 'w') as f:
+            f.write(source.replace(*_EXTRACTION_CHANGE))
+
+        # Первым в sys.path идет текущая папка - копия parser подменяет исходный пакет
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.environ.get('PYTHONPATH'), root])))
+        output = subprocess.check_output([sys.executable, '-c', _EXTRACTION_SCRIPT, os.path.abspath(filename)],
+                                         cwd=folder, env=env)
+        changed = tuple(output.split()[-2:])
+    finally:
+        shutil.rmtree(folder)
+
+    print "[Text cache] extraction changed: {text}, cache version changed: {version}".format(
+        text=changed[1] != expected[1], version=changed[0] != expected[0])
+    if changed[1] != expected[1] and changed[0] == expected[0]:
+        raise AssertionError('Cache version does not depend on text extraction')
+
+
+def main(filename):
+    text_cache(filename)
+    pos_tagging(filename)
+    punctuation(filename)
+    tokenizers(filename)
+    if HAS_NUMPY:
+        ngramms(filename)
+    vocabulary_store()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
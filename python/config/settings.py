@@ -2,6 +2,7 @@
 
 import sys
 from string import punctuation
+from multiprocessing import cpu_count
 
 DATABASE_HOST = '127.0.0.1'
 
@@ -18,6 +19,31 @@ FILES_FOLDER_PATH = '/etc/harold'
 CONFLICTS_FOLDER = 'conflicts'
 PICKLES_FOLDER = 'pickles'
 NGRAMMS_FOLDER_PATH = '/etc/harold/.ngramm'
+# Кэш очищенных и токенизированных текстов по sha256 исходного файла
+TEXT_CACHE_FOLDER_PATH = '/etc/harold/.cache'
+
+# Максимальное кол-во словоформ в кэше частей речи (см. nlp/morphology.py)
+MORPH_CACHE_SIZE = 200000
+# Стратегия определения частей речи: 'vocabulary' - по уникальным словоформам,
+# 'tokens' - по каждому слову текста (см. TextProcessor._define_part_of_speech)
+POS_TAGGING_STRATEGY = 'vocabulary'
+# Кол-во процессов для определения частей речи одной большой книги
+POS_TAGGING_WORKERS = 1
+# Токенизатор предложений: 'nltk' (эталон) или 'regex' (см. nlp.tokenizers)
+TOKENIZER_BACKEND = 'nltk'
+# Порядки частеречевых N-грамм (n, <пропуск>): n частей речи через каждые <пропуск> + 1 слов,
+# например (2, 0) - биграммы, (2, 1) - пары через одно слово (см. nlp/ngramms.py).
+# Все порядки собираются за один проход и сохраняются в таблицу text_ngramms
+NGRAMM_ORDERS = [(3, 0)]
+# Дополнительно сохранять плотный вектор первого порядка в texts.ngramms_array (длиной во весь словарь)
+DENSE_NGRAMMS_ARRAY = False
+# Кол-во записей журнала словаря N-грамм, после которого журнал переносится в снимок (см. nlp/vocabulary_store.py)
+NGRAMM_LOG_COMPACTION = 50000
+# Постоянный лексикон словоформ и их частей речи, общий для всех книг (см. nlp/lexicon.py)
+LEXICON_PATH = '/etc/harold/.lexicon/lexicon.sqlite'
+
+# Кол-во процессов для параллельной обработки корпуса книг (см. nlp/corpus.py)
+CORPUS_WORKERS = cpu_count()
 
 # Добавлять вручную выявленные в процессе парсинга новые знаки пунктуации
 # попавшие в конфликты (см. лог файл)
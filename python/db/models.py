@@ -10,6 +10,8 @@ from sqlalchemy import Column, String, Integer, ForeignKey, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
+from nlp.vocabulary import densify, pad_vector
+from nlp.ngramms import MAIN_ORDER, order_name
 
 
 class DataBaseConnection(object):
@@ -101,6 +103,10 @@ class DataBaseConnection(object):
     def close_session(self):
         self.session.commit()
 
+    def exists(self, table, code_name):
+        v = self.session.query(table.id).filter(table.code_name==code_name)
+        return v.count() > 0
+
     def get_id(self, table, code_name=None):
         if code_name:
             v = self.session.query(table.id).filter(table.code_name==code_name)
@@ -109,10 +115,47 @@ class DataBaseConnection(object):
 
         return len(self.simple_select(table)) + 1
 
+    def replace_text_ngramms(self, text_id, sparse_vectors):
+        """Заменяет N-граммы текста text_id в таблице text_ngramms
+
+        sparse_vectors - {<имя порядка>: [(<номер N-граммы>, <кол-во>), ...]}; записываются
+        только N-граммы, встреченные в тексте, одним запросом на все строки
+        """
+        self.session.query(TextNgramm).filter(TextNgramm.text_id==text_id).delete(synchronize_session=False)
+        rows = [{'text_id': text_id, 'ngramm_order': order, 'ngramm_id': ngramm_id, 'count': count}
+                for order, pairs in sparse_vectors.iteritems() for ngramm_id, count in pairs]
+        if rows:
+            self.session.execute(TextNgramm.__table__.insert(), rows)
+
+    def get_text_ngramms(self, text_id, ngramm_order='3', size=None):
+        """Плотный вектор N-грамм порядка ngramm_order текста text_id, собранный из text_ngramms
+
+        size - длина вектора (обычно размер текущего общего словаря N-грамм этого порядка).
+        Для основного порядка по умолчанию это размер словаря, по которому построена запись
+        (texts.ngramms_size), а записи, сохраненные плотным вектором в texts.ngramms_array,
+        дополняются нулями при чтении; для остальных - до последней N-граммы текста
+        """
+        if ngramm_order == order_name(MAIN_ORDER):
+            text = self.session.query(Text).get(text_id)
+            if size is None:
+                size = text.ngramms_size
+            if text.ngramms_array is not None:
+                return text.ngramms_vector(size)
+
+        pairs = self.session.query(TextNgramm.ngramm_id, TextNgramm.count).\
+            filter(TextNgramm.text_id==text_id, TextNgramm.ngramm_order==ngramm_order)
+        return densify(pairs, size)
+
 
 dbc = DataBaseConnection()
 
 
+def get_connection():
+    """Общее для процесса подключение к БД harold: engine и отраженные метаданные
+    создаются один раз, а не при каждой проверке (см. TextSource.is_saved_to_db)"""
+    return dbc
+
+
 class Author(dbc.base):
     __tablename__ = 'authors'
     __table_args__ = {'extend_existing': True}
@@ -145,3 +188,23 @@ class Text(dbc.base):
     parts_array = Column(ARRAY(Integer, dimensions=1))
     punct_array = Column(ARRAY(Integer, dimensions=1))
     code_name = Column(String, unique=True)
+    # Размер словаря N-грамм основного порядка, по которому построена запись
+    ngramms_size = Column(Integer)
+
+    def ngramms_vector(self, size=None):
+        """Вектор ngramms_array, дополненный нулями до size (обычно размер текущего словаря N-грамм)
+
+        Запись в БД при этом не меняется: N-граммы, добавленные в словарь после ngramms_size,
+        в тексте не встречались
+        """
+        return pad_vector(self.ngramms_array, size if size is not None else self.ngramms_size)
+
+
+class TextNgramm(dbc.base):
+    __tablename__ = 'text_ngramms'
+    __table_args__ = {'extend_existing': True}
+
+    text_id = Column(Integer, ForeignKey('texts.id'), primary_key=True)
+    ngramm_order = Column(String, primary_key=True)
+    ngramm_id = Column(Integer, primary_key=True)
+    count = Column(Integer)
@@ -5,17 +5,25 @@
     - выгрузка конфликтов из этого файла
 
     - сохранение в pickle файлы информации о собранных статистиках
+    - кэш очищенных и токенизированных текстов
 
 """
 
 import logging
-from config.settings import FILES_FOLDER_PATH, CONFLICTS_FOLDER, PICKLES_FOLDER, NGRAMMS_FOLDER_PATH
+from config.settings import FILES_FOLDER_PATH, CONFLICTS_FOLDER, PICKLES_FOLDER, TEXT_CACHE_FOLDER_PATH
 import os
 import io
 import cPickle as pickle
 
 logger = logging.getLogger('harold.file_processor')
 
+# Режимы разбора текста. Потоковый режим делит текст на предложения по параграфам
+# (см. TextProcessor._iter_sentences), и индексы предложений могут не совпасть с пакетным,
+# поэтому режим записывается в имя файла конфликтов: conflicts_<номер>.csv, conflicts_stream_<номер>.csv
+BATCH_MODE = 'batch'
+STREAM_MODE = 'stream'
+CONFLICTS_PREFIXES = {BATCH_MODE: 'conflicts_', STREAM_MODE: 'conflicts_stream_'}
+
 
 class FileProcessor(object):
 
@@ -41,22 +49,23 @@ class FileProcessor(object):
         self.speech_parts_filename = '/'.join([self.pickles_folder, 'speech_parts.pkl'])
         self.punctuation_filename = '/'.join([self.pickles_folder, 'punctuation.pkl'])
         self.pos_filename = '/'.join([self.pickles_folder, 'pos.pkl'])
-        self.ngramm_filename = '/'.join([NGRAMMS_FOLDER_PATH, 'ngramm.pkl'])
+        self.conflict_index_filename = '/'.join([self.pickles_folder, 'conflict_index.pkl'])
 
-        self.ngramm_backup_folder = '/'.join([NGRAMMS_FOLDER_PATH, 'backups'])
+        if not os.path.exists(TEXT_CACHE_FOLDER_PATH):
+            os.makedirs(TEXT_CACHE_FOLDER_PATH)
 
-    def save_conflicts_to_csv(self, conflicts, sentences):
+    def save_conflicts_to_csv(self, conflicts, sentences, mode=BATCH_MODE):
         """Записывает слова с csv файл в следующем формате:
 
         <номер>, <чатсь речи>, <слово>, <кол-во таких слов>
                ,             ,        , <предложение>, <индекс-предложения>, <индекс-слова>
 
+        mode - режим разбора текста (BATCH_MODE или STREAM_MODE), в котором найдены конфликты
         """
 
-        filename = 'conflicts'
         counter = len(os.listdir(self.conflicts_folder)) + 1
 
-        filename = filename + '_' + str(counter) + '.csv'
+        filename = CONFLICTS_PREFIXES[mode] + str(counter) + '.csv'
         filename = '/'.join([self.conflicts_folder, filename])
         f = io.open(filename, 'w+', encoding='utf-8')
 
@@ -81,12 +90,20 @@ class FileProcessor(object):
 
         return counter, filename
 
+    def conflicts_mode(self, filename):
+        """Режим разбора текста, в котором записан файл конфликтов"""
+        if os.path.basename(filename).startswith(CONFLICTS_PREFIXES[STREAM_MODE]):
+            return STREAM_MODE
+        return BATCH_MODE
+
     def read_conflicts_from_csv(self, filename):
         """Считывает информацию из обработанного файла, содержащего описание конфликтов
 
                    0          1           2         3                 4                   5
                 <номер>, <чатсь речи>, <слово>, <кол-во таких слов>
                        ,             ,        , <предложение>, <индекс-предложения>, <индекс-слова>
+
+                Возвращает список (<часть речи>, <индекс-предложения>, <индекс-слова>, <слово>)
                 """
         result = []
         with io.open(filename, 'r', encoding='utf-8') as f:
@@ -104,9 +121,10 @@ class FileProcessor(object):
 
                 capacity = line[3]
                 pos = line[2]
+                word = line[1]
                 for i in range(int(capacity)):
                     line = next(line_iter, None).split(',')
-                    result.append((pos, int(line[4]), int(line[5])))
+                    result.append((pos, int(line[4]), int(line[5]), word))
 
         return result
 
@@ -167,33 +185,54 @@ class FileProcessor(object):
 
         return obj
 
-    def load_ngramm_from_pickle(self):
-        """Загружает список ngramm
+    def save_conflict_index_to_pickle(self, conflict_index):
+        """Сохраняет позиции неразрешенных конфликтов
         """
 
-        inp = open(self.ngramm_filename, 'rb')
+        output = open(self.conflict_index_filename, 'wb')
+        pickle.dump(conflict_index, output, 2)
+        output.close()
+        logger.info('[PICKLE] File was written: {file}'.format(file=self.conflict_index_filename))
+
+    def load_conflict_index_from_pickle(self):
+        """Загружает позиции неразрешенных конфликтов или None, если файла еще нет"""
+
+        if not os.path.exists(self.conflict_index_filename):
+            return None
+        inp = open(self.conflict_index_filename, 'rb')
         obj = pickle.load(inp)
         inp.close()
-        logger.info('[PICKLE] File was read: {file}'.format(file=self.ngramm_filename))
-        print 'ngramm loaded:', len(obj)
+        logger.info('[PICKLE] File was read: {file}'.format(file=self.conflict_index_filename))
 
         return obj
 
-    def save_ngramm_to_pickle(self, ngramm):
-        """Сохраняет N-граммы в файл"""
+    def load_text_cache(self, key, version):
+        """Загружает очищенный и токенизированный текст из кэша.
 
-        output = open(self.ngramm_filename, 'wb')
-        pickle.dump(ngramm, output, 2)
-        output.close()
-        print 'ngramm saved:', len(ngramm)
-        logger.info('[PICKLE] File was written: {file}'.format(file=self.ngramm_filename))
+        key - sha256 исходного файла, version - версия правил очистки.
+        Если запись отсутствует или построена по другим правилам, возвращает None
+        """
+        filename = '/'.join([TEXT_CACHE_FOLDER_PATH, key + '.pkl'])
+        if not os.path.exists(filename):
+            return None
+
+        inp = open(filename, 'rb')
+        obj = pickle.load(inp)
+        inp.close()
+
+        if obj.get('version') != version:
+            logger.info('[CACHE] Stale entry was skipped: {file}'.format(file=filename))
+            return None
+
+        logger.info('[CACHE] File was read: {file}'.format(file=filename))
+        return obj
 
-        # BACKUP
-        filename = 'ngramms'
-        counter = len(os.listdir(self.ngramm_backup_folder)) + 1
-        filename = filename + '_' + str(counter) + '_' + str(len(ngramm)) + '.pkl'
-        filename = '/'.join([self.ngramm_backup_folder, filename])
+    def save_text_cache(self, key, version, obj):
+        """Сохраняет очищенный и токенизированный текст в кэш"""
+        filename = '/'.join([TEXT_CACHE_FOLDER_PATH, key + '.pkl'])
+        obj = dict(obj, version=version)
 
         output = open(filename, 'wb')
-        pickle.dump(ngramm, output, 2)
+        pickle.dump(obj, output, 2)
         output.close()
+        logger.info('[CACHE] File was written: {file}'.format(file=filename))
@@ -4,8 +4,12 @@
 """
 from logger import set_logger
 import logging
-from parser.fiction_book import FictionBook
+import os
+import sys
+from parser.fiction_book import FictionBook, iter_books
+from parser.archive import iter_bundle
 from nlp.text_processor import TextProcessor
+from nlp.corpus import CorpusProcessor
 
 
 def main():
@@ -24,7 +28,8 @@ def main_menu(prev):
           "\t[2] First morphological analysis - after handling tokenization issues\n" \
           "\t[3] Resolve morphological conflicts - read from generated csv file\n" \
           "\t[4] Collect N-gramms - save all statistics vectors to DB Harold\n" \
-          "\t[5] Exit".format(prev=prev)
+          "\t[5] Exit\n" \
+          "\t[6] Stream processing - all steps in one pass with bounded memory".format(prev=prev)
     option = raw_input("> ")
     return int(option)
 
@@ -37,8 +42,8 @@ def ui():
 
     print
     print "Welcome to the Harold Morphology Analytics System"
-    filename = raw_input("Please enter filename with fb2 extension to proceed: ")
-    tp = TextProcessor(filename)
+    filename = raw_input("Please enter fb2, fb2.zip, txt filename or folder with text parts to proceed: ")
+    tp = TextProcessor(filename, stream=True)
     previous_option = 0
     option = 0
     saved_to_file = False
@@ -48,7 +53,7 @@ def ui():
         option = main_menu(previous_option)
 
         if option == 1:
-            if tp and tp.file.text:
+            if tp:
                 tp.raw_text_processing()
             else:
                 print 'ERROR - no text!'
@@ -84,6 +89,18 @@ def ui():
         if option == 5:
             break
 
+        if option == 6:
+            if tp:
+                _ = raw_input("\tPlease, enter files with resolved conflicts separated by commas (if any): ")
+                filenames = [name.strip() for name in _.split(',') if name.strip()]
+                if tp.stream_text_processing(filenames):
+                    print "\tText processing is finished. result is saved to DB"
+                else:
+                    print "\tResolve conflicts and run stream processing again with all resolved files"
+                tp = TextProcessor(filename, stream=True)
+            else:
+                print 'ERROR - no text'
+
         previous_option = option
 
     print filename
@@ -94,5 +111,36 @@ def ui():
 
     return 0
 
+def corpus(paths):
+    """Пакетная обработка корпуса: python main.py <папка или файл> [...]"""
+    set_logger()
+
+    logger = logging.getLogger('harold.main')
+    logger.info('Harold System has been launched in corpus mode')
+
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(iter_books(path))
+        elif path.endswith('.zip'):
+            # Сборник книг: каждая книга архива - отдельный источник
+            sources.extend(iter_bundle(path))
+        else:
+            sources.append(path)
+
+    cp = CorpusProcessor(sources)
+    cp.run()
+
+    print "\tBooks saved to DB: {}".format(len(cp.processed))
+    for code_name, path in cp.postponed:
+        print "\tConflicts in {}: {}".format(code_name.encode('utf-8'), path)
+    for source in cp.failed:
+        print "\tFailed: {}".format(source)
+
+    return 0
+
 if __name__ == "__main__":
-    ui()
+    if len(sys.argv) > 1:
+        corpus(sys.argv[1:])
+    else:
+        ui()
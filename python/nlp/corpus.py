@@ -0,0 +1,101 @@
+# coding: utf-8
+"""
+Модуль параллельной обработки корпуса книг
+
+Очистка, токенизация, морфологический анализ и подсчет N-грамм каждой книги
+не зависят от остальных книг, поэтому книги распределяются по пулу процессов.
+Процессы-обработчики возвращают только счетчики (см. TextProcessor.batch_processing),
+а общие словари N-грамм (ngramm*.pkl) и записи в БД harold собираются в главном
+процессе последовательно, в порядке следования книг
+"""
+
+import logging
+import time
+from multiprocessing import Pool
+from nlp.text_processor import TextProcessor
+from nlp.morphology import warm_up
+from nlp.ngramms import order_name
+from nlp.vocabulary_store import get_vocabulary_store
+from config.settings import CORPUS_WORKERS
+
+logger = logging.getLogger('harold.corpus')
+
+
+def process_book(source):
+    """Обработка одной книги в процессе-обработчике"""
+    try:
+        return TextProcessor(source, stream=True).batch_processing()
+    except Exception:
+        logger.exception('\n[CORPUS] Book processing failed: {source}'.format(source=source))
+        return {'source': source, 'code_name': None, 'conflicts': None, 'error': True}
+
+
+class CorpusProcessor(object):
+
+    def __init__(self, sources, workers=CORPUS_WORKERS):
+        """sources - пути к файлам *.fb2, *.fb2.zip или книги внутри архивов
+        (см. parser.fiction_book.iter_books)"""
+        self.sources = list(sources)
+        self.workers = workers
+        self.processed = []
+        self.postponed = []
+        self.failed = []
+
+    def _process(self):
+        # Словари pymorphy2 загружаются до fork и остаются общими для всех процессов
+        warm_up()
+        if self.workers > 1:
+            pool = Pool(processes=self.workers)
+            try:
+                # imap сохраняет порядок книг - порядок новых N-грамм не зависит от числа процессов
+                return list(pool.imap(process_book, self.sources))
+            finally:
+                pool.close()
+                pool.join()
+        return [process_book(source) for source in self.sources]
+
+    def _merge(self, results):
+        """Дополняет общие словари N-грамм новыми N-граммами всех книг"""
+        ngramm_vocabularies = None
+        processors = []
+        for result in results:
+            if result.get('error'):
+                self.failed.append(result['source'])
+                continue
+            if result['conflicts']:
+                self.postponed.append((result['code_name'], result['conflicts']))
+                continue
+
+            tp = TextProcessor(result['source'], stream=True)
+            if ngramm_vocabularies is None:
+                ngramm_vocabularies = tp.ngramm_vocabularies
+            tp.load_statistics(result, ngramm_vocabularies)
+            processors.append(tp)
+
+        if processors:
+            for order in ngramm_vocabularies:
+                get_vocabulary_store(order_name(order)).save()
+        return processors
+
+    def run(self):
+        """Обрабатывает корпус и сохраняет статистики всех книг в БД harold"""
+        ts = time.time()
+        processors = self._merge(self._process())
+
+        for tp in processors:
+            tp.save_to_db()
+            self.processed.append(tp.file.book_code_name)
+        te = time.time()
+
+        logger.info('\n[CORPUS] Corpus was processed with {workers} workers:\n'
+                    '\tTotal books: {total}\n'
+                    '\tSaved to DB: {saved}\n'
+                    '\tPostponed due to conflicts: {postponed}\n'
+                    '\tFailed: {failed}\n'
+                    '\tTime taken: {time} s'.format(workers=self.workers,
+                                                    total=len(self.sources),
+                                                    saved=len(self.processed),
+                                                    postponed=len(self.postponed),
+                                                    failed=len(self.failed),
+                                                    time=te - ts))
+        return self.processed
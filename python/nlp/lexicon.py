@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+Модуль постоянного словаря (лексикона) <словоформа> -> <часть речи>, общего для всех книг
+
+Лексикон хранится в SQLite и пополняется:
+
+    - результатами pymorphy2                        // source = 'morph'
+    - вручную разрешенными конфликтами из csv       // source = 'manual'
+
+Ручные ответы имеют приоритет и не перезаписываются результатами pymorphy2.
+Поэтому неизвестное pymorphy2 слово достаточно разрешить один раз - в следующих
+книгах оно уже не будет конфликтом
+"""
+
+import logging
+import os
+import sqlite3
+from config.settings import LEXICON_PATH
+
+logger = logging.getLogger('harold.lexicon')
+
+MORPH = 'morph'
+MANUAL = 'manual'
+
+
+class Lexicon(object):
+
+    def __init__(self, path=LEXICON_PATH):
+        self.path = path
+        self._connection = None
+        self._pid = None
+        # Новые записи копятся в памяти и записываются одной транзакцией в save()
+        self._pending = {MORPH: {}, MANUAL: {}}
+
+    @property
+    def connection(self):
+        # Соединение SQLite нельзя передавать через fork - в новом процессе открывается свое
+        if self._connection is None or self._pid != os.getpid():
+            folder = os.path.dirname(self.path)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS lexicon '
+                                     '(word TEXT PRIMARY KEY, pos TEXT NOT NULL, source TEXT NOT NULL)')
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, word):
+        """Часть речи словоформы или None, если словоформы нет в лексиконе"""
+        if word in self._pending[MANUAL]:
+            return self._pending[MANUAL][word]
+        row = self.connection.execute('SELECT pos FROM lexicon WHERE word = ?', (word,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def add(self, word, pos, source=MORPH):
+        self._pending[source][word] = pos
+
+    def save(self):
+        """Записывает новые словоформы в лексикон"""
+        morph, manual = self._pending[MORPH], self._pending[MANUAL]
+        if not morph and not manual:
+            return
+
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO lexicon (word, pos, source) VALUES (?, ?, ?)',
+                                        [(word, pos, MORPH) for word, pos in morph.iteritems()])
+            self.connection.executemany('INSERT OR REPLACE INTO lexicon (word, pos, source) VALUES (?, ?, ?)',
+                                        [(word, pos, MANUAL) for word, pos in manual.iteritems()])
+
+        logger.info('\n[LEXICON] Words were saved: {morph} from pymorph, {manual} resolved manually'.format(
+            morph=len(morph), manual=len(manual)))
+        self._pending = {MORPH: {}, MANUAL: {}}
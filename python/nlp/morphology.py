@@ -0,0 +1,254 @@
+# coding: utf-8
+"""
+Модуль определения частей речи слов с помощью pymorphy2
+
+Тексты подчиняются закону Ципфа: большая часть слов текста - это несколько тысяч
+часто повторяющихся словоформ. Поэтому перед pymorphy2 стоит кэш
+<словоформа> -> <часть речи>, и анализатор вызывается для каждой словоформы один раз.
+Кэш в памяти дополнен постоянным лексиконом (см. nlp.lexicon), который проверяется
+до обращения к анализатору и хранит также вручную разрешенные конфликты
+
+Загрузка словарей pymorphy2 занимает сотни миллисекунд и десятки MB памяти,
+поэтому анализатор и кэш создаются один раз на процесс (get_pos_cache).
+Перед запуском процессов-обработчиков словари загружаются заранее (warm_up),
+и после fork их страницы памяти остаются общими (copy-on-write)
+
+Функции tag_* определяют части речи списка предложений и не зависят от TextProcessor,
+поэтому текст одной большой книги можно разделить на диапазоны предложений
+и обработать в пуле процессов (tag_shard)
+"""
+
+from array import array
+from collections import OrderedDict, defaultdict
+from pymorphy2 import MorphAnalyzer
+from nlp.lexicon import Lexicon, MANUAL
+from nlp.speech_parts import SpeechParts, CODES, NOPOS, NONE
+from config.settings import MORPH_CACHE_SIZE
+
+_morph_analyzer = None
+_pos_cache = None
+
+
+class PosCache(object):
+    """Кэш частей речи ограниченного размера с вытеснением давно не использованных слов (LRU)"""
+
+    def __init__(self, morph, lexicon=None, size=MORPH_CACHE_SIZE):
+        self.morph = morph
+        self.lexicon = lexicon
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.lexicon_hits = 0
+        self._cache = OrderedDict()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.lexicon_hits = 0
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'lexicon_hits': self.lexicon_hits}
+
+    def add_stats(self, stats):
+        """Добавляет счетчики кэша другого процесса (см. tag_shard)"""
+        self.hits += stats['hits']
+        self.misses += stats['misses']
+        self.lexicon_hits += stats['lexicon_hits']
+
+    def _parse(self, word):
+        if self.lexicon is not None:
+            pos = self.lexicon.get(word)
+            if pos is not None:
+                self.lexicon_hits += 1
+                return pos
+
+        pos = self.morph.parse(word)[0].tag.POS
+        if pos is None:
+            return NOPOS
+        pos = pos.__str__()
+        if self.lexicon is not None:
+            self.lexicon.add(word, pos)
+        return pos
+
+    def learn(self, word, pos):
+        """Запоминает вручную разрешенную часть речи слова (или NONE)"""
+        if word in self._cache:
+            self._cache[word] = pos
+        if self.lexicon is not None:
+            self.lexicon.add(word, pos, MANUAL)
+
+    def save(self):
+        if self.lexicon is not None:
+            self.lexicon.save()
+
+    def get(self, word):
+        """Часть речи словоформы или NOPOS, если pymorphy2 ее не определил"""
+        try:
+            pos = self._cache.pop(word)
+            self.hits += 1
+        except KeyError:
+            pos = self._parse(word)
+            self.misses += 1
+            if len(self._cache) >= self.size:
+                self._cache.popitem(last=False)
+        self._cache[word] = pos
+        return pos
+
+
+def get_morph_analyzer():
+    """Общий для процесса анализатор pymorphy2, создается при первом обращении"""
+    global _morph_analyzer
+    if _morph_analyzer is None:
+        _morph_analyzer = MorphAnalyzer()
+    return _morph_analyzer
+
+
+def get_pos_cache():
+    """Общий для процесса кэш частей речи"""
+    global _pos_cache
+    if _pos_cache is None:
+        _pos_cache = PosCache(get_morph_analyzer(), Lexicon())
+    return _pos_cache
+
+
+def warm_up():
+    """Загружает словари pymorphy2 заранее, до запуска процессов-обработчиков"""
+    get_pos_cache()
+
+
+def _add_conflict(conflicts, word, index):
+    if word not in conflicts:
+        conflicts[word] = {'speech_part': u'NOUN', 'indicies': [index]}
+    else:
+        conflicts[word]['indicies'].append(index)
+
+
+def tag_sentence(s, words, morph, conflicts, pos_counts, answers=None):
+    """Определяет части речи слов предложения s
+
+    Слова, для которых часть речи не определена, помечаются 'NOPOS' и добавляются
+    в словарь conflicts. Если передан словарь answers {(s, w): <часть речи>}
+    с уже разрешенными конфликтами, ответ из него применяется сразу.
+    Слова, признанные лишними ('NONE'), остаются на своих местах, чтобы индексы
+    слов не сдвигались, и пропускаются при подсчете N-грамм
+
+    morph - кэш частей речи (см. PosCache), pos_counts - счетчик частей речи текста
+
+    Возвращает список частей речи и кол-во слов без части речи
+    """
+    _sentence_pos = []
+    _count = 0
+    for w in range(len(words)):
+
+        word = words[w]
+        pos = morph.get(word)
+
+        if pos == NOPOS and answers and (s, w) in answers:
+            pos = answers[(s, w)]
+
+        if pos == NONE:
+            _sentence_pos.append(NONE)
+        elif pos == NOPOS:
+            _sentence_pos.append(NOPOS)
+            _count += 1
+            _add_conflict(conflicts, word, (s, w))
+        else:
+            _sentence_pos.append(pos)
+            pos_counts[pos] += 1
+
+    return _sentence_pos, _count
+
+
+def encode_words(sentences):
+    """Кодирует текст номерами уникальных словоформ
+
+    Возвращает список уникальных словоформ, массив номеров словоформ по всем позициям
+    текста и массив смещений начала каждого предложения в нем (с завершающим смещением)
+    """
+    forms = {}
+    ids = array('I')
+    offsets = array('I', [0])
+    for sentence in sentences:
+        for word in sentence:
+            i = forms.get(word)
+            if i is None:
+                i = forms[word] = len(forms)
+            ids.append(i)
+        offsets.append(len(ids))
+
+    vocabulary = [None] * len(forms)
+    for word, i in forms.iteritems():
+        vocabulary[i] = word
+    return vocabulary, ids, offsets
+
+
+def tag_by_tokens(sentences, morph, conflicts, pos_counts, offset=0):
+    """Определяет часть речи каждого слова текста по очереди
+
+    offset - номер первого предложения в тексте, индексы конфликтов считаются от начала текста
+
+    Возвращает части речи по предложениям (см. nlp.speech_parts) и кол-во слов без части речи
+    """
+    speech_parts = SpeechParts()
+    _count = 0
+    for s, words in enumerate(sentences, offset):
+
+        _sentence_pos, nopos = tag_sentence(s, words, morph, conflicts, pos_counts)
+        _count += nopos
+        speech_parts.append(_sentence_pos)
+
+    return speech_parts, _count
+
+
+def tag_by_vocabulary(sentences, morph, conflicts, pos_counts, offset=0):
+    """Определяет часть речи каждой уникальной словоформы текста один раз и
+    расставляет результаты по позициям текста через массив номеров словоформ
+
+    Аргументы и результат - как у tag_by_tokens
+    """
+    vocabulary, ids, offsets = encode_words(sentences)
+    tags = [morph.get(word) for word in vocabulary]
+
+    frequency = [0] * len(vocabulary)
+    for i in ids:
+        frequency[i] += 1
+    for i, pos in enumerate(tags):
+        if pos != NOPOS and pos != NONE:
+            pos_counts[pos] += frequency[i]
+
+    # Массив номеров словоформ и смещения предложений сразу превращаются в коды частей речи
+    codes = [CODES[pos] for pos in tags]
+    speech_parts = SpeechParts(array('B', [codes[i] for i in ids]), offsets)
+
+    _count = 0
+    if NOPOS in tags:
+        for s, w in speech_parts.find(NOPOS):
+            _count += 1
+            _add_conflict(conflicts, sentences[s][w], (offset + s, w))
+
+    return speech_parts, _count
+
+
+def tag_shard(shard):
+    """Обработка диапазона предложений в процессе-обработчике
+
+    shard - (<номер первого предложения>, <предложения>, <стратегия>)
+
+    Возвращает части речи по предложениям, счетчик частей речи, конфликты
+    с индексами от начала текста, кол-во слов без части речи и счетчики кэша
+    """
+    offset, sentences, strategy = shard
+    morph = get_pos_cache()
+    # Процесс пула может обработать несколько диапазонов - счетчики кэша считаются для каждого
+    morph.reset_stats()
+    conflicts = dict()
+    pos_counts = defaultdict(int)
+
+    if strategy == 'tokens':
+        speech_parts, _count = tag_by_tokens(sentences, morph, conflicts, pos_counts, offset)
+    else:
+        speech_parts, _count = tag_by_vocabulary(sentences, morph, conflicts, pos_counts, offset)
+    # Новые словоформы записываются в лексикон из каждого процесса (SQLite блокирует запись)
+    morph.save()
+
+    return speech_parts, dict(pos_counts), conflicts, _count, morph.get_stats()
@@ -0,0 +1,162 @@
+# coding: utf-8
+"""
+Модуль подсчета частеречевых N-грамм на NumPy
+
+Порядок N-грамм задается парой (n, <пропуск>): n частей речи, взятых через
+каждые <пропуск> + 1 слов. (3, 0) - обычные триграммы, (2, 1) - пары частей речи
+через одно слово (skip-граммы). Набор порядков задается настройкой NGRAMM_ORDERS
+
+Коды частей речи текста (см. nlp.speech_parts) переводятся в плотный алфавит
+SPEECH_PARTS + NOPOS, и каждая N-грамма кодируется одним числом в системе
+счисления с основанием размера алфавита:
+
+    code = a * base^2 + b * base + c
+
+Коды строятся последовательно: коды N-грамм порядка n получаются из кодов
+порядка n - 1 с тем же шагом умножением на base и добавлением следующего слова,
+поэтому все порядки собираются за один проход по тексту на каждый шаг.
+Окна, которые пересекают границу предложения, отбрасываются маской, слова,
+признанные лишними ('NONE'), удаляются до построения окон. Подсчет выполняет
+np.bincount, а строки вида 'NOUN-VERB-PREP' создаются только для различных
+N-грамм при выгрузке результата
+
+NumPy не обязателен: без него TextProcessor считает N-граммы по предложениям
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from config.settings import SPEECH_PARTS, NGRAMM_ORDERS
+from nlp.speech_parts import NOPOS, NOPOS_CODE, NONE_CODE
+
+HAS_NUMPY = np is not None
+
+ALPHABET = list(SPEECH_PARTS) + [NOPOS]
+BASE = len(ALPHABET)
+
+# Основной порядок: его счетчики - TextProcessor.ngramm, плотный вектор - texts.ngramms_array
+MAIN_ORDER = NGRAMM_ORDERS[0]
+
+# Больше кодов не считаются через np.bincount - таблица счетчиков была бы слишком большой
+BINCOUNT_LIMIT = 1 << 22
+
+_dense_codes = None
+
+
+def order_name(order):
+    """Имя порядка N-грамм: '3' для (3, 0), '2s1' для (2, 1)"""
+    n, skip = order
+    if skip:
+        return '{n}s{skip}'.format(n=n, skip=skip)
+    return str(n)
+
+
+def order_span(order):
+    """Кол-во слов текста, которое занимает одна N-грамма порядка order"""
+    n, skip = order
+    return (n - 1) * (skip + 1) + 1
+
+
+def _get_dense_codes():
+    """Таблица перевода кодов частей речи в номера алфавита"""
+    global _dense_codes
+    if _dense_codes is None:
+        _dense_codes = np.zeros(256, dtype=np.int64)
+        _dense_codes[:len(SPEECH_PARTS)] = np.arange(len(SPEECH_PARTS))
+        _dense_codes[NOPOS_CODE] = len(SPEECH_PARTS)
+    return _dense_codes
+
+
+def decode_ngramm(code, n):
+    """Строка N-граммы по ее числовому коду"""
+    code = int(code)
+    tags = []
+    for _ in range(n):
+        tags.append(ALPHABET[code % BASE])
+        code //= BASE
+    return '-'.join(reversed(tags))
+
+
+def encode_ngramms(speech_parts, orders=NGRAMM_ORDERS):
+    """Числовые коды N-грамм текста в порядке следования
+
+    Возвращает словарь {<порядок>: <массив кодов>}
+    """
+    codes = np.frombuffer(speech_parts.codes.tostring(), dtype=np.uint8)
+    offsets = np.frombuffer(speech_parts.offsets.tostring(), dtype=np.uint32).astype(np.int64)
+    sentences = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    keep = codes != NONE_CODE
+    codes = _get_dense_codes()[codes[keep]]
+    sentences = sentences[keep]
+
+    result = {}
+    for step in sorted(set(skip + 1 for n, skip in orders)):
+        wanted = set(n for n, skip in orders if skip + 1 == step)
+        rolling = codes
+        for n in range(1, max(wanted) + 1):
+            if n > 1:
+                # Текст короче окна: срез должен остаться пустым, а не отсчитываться с конца
+                rolling = rolling[:max(len(codes) - (n - 1) * step, 0)] * BASE + codes[(n - 1) * step:]
+            if n in wanted:
+                order = (n, step - 1)
+                span = order_span(order)
+                # Слова одного предложения идут подряд, поэтому достаточно сравнить крайние слова окна
+                result[order] = rolling[sentences[:len(rolling)] == sentences[span - 1:]]
+    return result
+
+
+def _first_occurrences(ngramms, present, size):
+    """Позиции первого появления N-грамм present в тексте
+
+    Текст просматривается префиксами удваивающейся длины: большинство N-грамм
+    встречается в начале текста, а дальше ищутся только еще не найденные
+    """
+    first = np.zeros(size, dtype=np.int64)
+    missing = np.zeros(size, dtype=bool)
+    missing[present] = True
+    left = len(present)
+
+    start = 0
+    chunk_size = 1 << 12
+    while left:
+        chunk = ngramms[start:start + chunk_size]
+        hits = np.flatnonzero(missing[chunk])
+        if len(hits):
+            values, index = np.unique(chunk[hits], return_index=True)
+            first[values] = hits[index] + start
+            missing[values] = False
+            left -= len(values)
+        start += chunk_size
+        chunk_size <<= 1
+    return first[present]
+
+
+def _count_codes(ngramms, n):
+    """Различные коды N-грамм в порядке первого появления и их кол-во"""
+    size = BASE ** n
+    if size > BINCOUNT_LIMIT:
+        values, first, counts = np.unique(ngramms, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='mergesort')
+        return values[order], counts[order]
+
+    counts = np.bincount(ngramms, minlength=size)
+    present = np.flatnonzero(counts)
+    values = present[np.argsort(_first_occurrences(ngramms, present, size), kind='mergesort')]
+    return values, counts[values]
+
+
+def count_ngramms(speech_parts, orders=NGRAMM_ORDERS):
+    """Считает N-граммы частей речи всех порядков orders
+
+    Возвращает словарь {<порядок>: [(<N-грамма>, <кол-во>), ...]}, пары идут
+    в порядке первого появления N-граммы в тексте
+    """
+    result = {}
+    for order, ngramms in encode_ngramms(speech_parts, orders).iteritems():
+        n = order[0]
+        values, counts = _count_codes(ngramms, n)
+        result[order] = [(decode_ngramm(code, n), int(count)) for code, count in zip(values, counts)]
+    return result
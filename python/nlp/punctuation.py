@@ -0,0 +1,81 @@
+# coding: utf-8
+"""
+Модуль подсчета и удаления знаков пунктуации
+
+nltk отделяет от слов не все знаки пунктуации: кавычки-«елочки», многоточия, тире
+и т.п. остаются внутри токенов. Такие знаки (CUSTOM_PUNCTUATION_SYMBOLS) вырезаются
+из слова и учитываются в статистике пунктуации.
+
+Все таблицы строятся один раз на процесс (get_punctuation_engine):
+
+    - класс символов, из которых состоят знаки, - быстрая проверка, что в предложении
+      нет пунктуации внутри слов (так у большинства предложений)
+    - регулярное выражение, в котором многосимвольные знаки ('***', '**', '..')
+      стоят раньше своих частей, - находит знаки внутри слова целиком
+    - таблица для unicode.translate, которая вырезает односимвольные знаки;
+      многосимвольные знаки вырезаются регулярным выражением
+"""
+
+import re
+from collections import Counter
+from config.settings import CUSTOM_PUNCTUATION_SYMBOLS, PUNCTUATION_SYMBOLS
+
+_punctuation_engine = None
+
+
+class PunctuationEngine(object):
+
+    def __init__(self, symbols=PUNCTUATION_SYMBOLS, inside_word=CUSTOM_PUNCTUATION_SYMBOLS):
+        """symbols - знаки, которые учитываются в статистике,
+        inside_word - знаки, которые вырезаются из слов"""
+        self.symbols = frozenset(symbols)
+        self._probe = re.compile(u'[%s]' % re.escape(u''.join(set(u''.join(inside_word)))), re.UNICODE)
+        self._delete = dict((ord(symbol), None) for symbol in inside_word if len(symbol) == 1)
+        # Сначала самые длинные знаки, иначе '***' разобьется на '**' и '*'
+        self._pattern = re.compile(u'|'.join(re.escape(symbol)
+                                             for symbol in sorted(inside_word, key=len, reverse=True)),
+                                   re.UNICODE)
+
+    @staticmethod
+    def new_counts():
+        """Счетчик знаков пунктуации с нулевыми значениями для всех знаков"""
+        return Counter(dict.fromkeys(PUNCTUATION_SYMBOLS, 0))
+
+    def split(self, tokens, counts):
+        """Отделяет знаки пунктуации от слов предложения, вырезает знаки
+        из самих слов (см. strip) и добавляет все знаки в counts
+
+        Возвращает список очищенных слов
+        """
+        words = []
+        for token in tokens:
+            if token in self.symbols:
+                counts[token] += 1
+            else:
+                words.append(token)
+
+        # Одна проверка на все предложение: в большинстве предложений слова без пунктуации
+        if self._probe.search(u''.join(words)) is None:
+            return words
+        return [self.strip(word, counts) for word in words]
+
+    def strip(self, word, counts):
+        """Вырезает знаки пунктуации из слова и добавляет их в counts"""
+        if self._probe.search(word) is None:
+            return word
+        found = self._pattern.findall(word)
+        if not found:
+            # В слове есть только части многосимвольных знаков, например одна точка
+            return word
+        counts.update(found)
+        if all(len(symbol) == 1 for symbol in found):
+            return word.translate(self._delete)
+        return self._pattern.sub(u'', word)
+
+
+def get_punctuation_engine():
+    """Общий для процесса обработчик пунктуации"""
+    global _punctuation_engine
+    if _punctuation_engine is None:
+        _punctuation_engine = PunctuationEngine()
+    return _punctuation_engine
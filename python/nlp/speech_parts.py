@@ -0,0 +1,103 @@
+# coding: utf-8
+"""
+Модуль компактного хранения частей речи текста
+
+Части речи хранятся не списками строк, а номерами в SPEECH_PARTS - один байт
+на слово в общем массиве array('B') - и массивом смещений начала каждого
+предложения в нем (с завершающим смещением). Для слов без части речи и слов,
+признанных лишними, зарезервированы отдельные коды.
+
+В pickle-файл записываются только байты двух массивов, поэтому он на порядок
+меньше списка строк и загружается без создания объекта на каждое слово
+"""
+
+from array import array
+from config.settings import SPEECH_PARTS
+
+# Часть речи не определена - конфликт, который разрешается вручную
+NOPOS = 'NOPOS'
+# Слово признано лишним при разрешении конфликтов и не учитывается в статистике
+NONE = 'NONE'
+
+NOPOS_CODE = 254
+NONE_CODE = 255
+
+TAGS = list(SPEECH_PARTS) + [None] * (NOPOS_CODE - len(SPEECH_PARTS)) + [NOPOS, NONE]
+CODES = dict((tag, code) for code, tag in enumerate(TAGS) if tag is not None)
+
+
+class SpeechParts(object):
+    """Части речи текста по предложениям
+
+    Ведет себя как список предложений: len(), итерация и sp[s] отдают
+    части речи строками, а get(s, w)/set(s, w, pos) работают с отдельными словами
+    """
+
+    def __init__(self, codes=None, offsets=None):
+        self.codes = codes if codes is not None else array('B')
+        self.offsets = offsets if offsets is not None else array('I', [0])
+
+    @classmethod
+    def from_lists(cls, sentences):
+        """Перекодирует части речи из списков строк (pickle-файлы прежнего формата)"""
+        speech_parts = cls()
+        for sentence in sentences:
+            speech_parts.append(sentence)
+        return speech_parts
+
+    def append(self, sentence):
+        self.codes.extend([CODES[pos] for pos in sentence])
+        self.offsets.append(len(self.codes))
+
+    def extend(self, other):
+        shift = len(self.codes)
+        self.codes.extend(other.codes)
+        self.offsets.extend([offset + shift for offset in other.offsets[1:]])
+
+    def sentence_codes(self, s):
+        return self.codes[self.offsets[s]:self.offsets[s + 1]]
+
+    def get(self, s, w):
+        return TAGS[self.codes[self.offsets[s] + w]]
+
+    def set(self, s, w, pos):
+        self.codes[self.offsets[s] + w] = CODES[pos]
+
+    def find(self, pos):
+        """Позиции (s, w) всех слов с частью речи pos в порядке следования в тексте"""
+        result = []
+        data = self.codes.tostring()
+        marker = chr(CODES[pos])
+        s = 0
+        i = data.find(marker)
+        while i >= 0:
+            while self.offsets[s + 1] <= i:
+                s += 1
+            result.append((s, i - self.offsets[s]))
+            i = data.find(marker, i + 1)
+        return result
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, s):
+        return [TAGS[code] for code in self.sentence_codes(s)]
+
+    def __iter__(self):
+        for s in range(len(self)):
+            yield self[s]
+
+    def __eq__(self, other):
+        return isinstance(other, SpeechParts) and self.codes == other.codes and self.offsets == other.offsets
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getstate__(self):
+        return {'codes': self.codes.tostring(), 'offsets': self.offsets.tostring()}
+
+    def __setstate__(self, state):
+        self.codes = array('B')
+        self.codes.fromstring(state['codes'])
+        self.offsets = array('I')
+        self.offsets.fromstring(state['offsets'])
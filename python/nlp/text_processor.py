@@ -15,48 +15,123 @@ tokenization/punkt/russian.pickle -> $ git clone https://github.com/mhq/train_pu
 """
 
 import logging
-from parser.fiction_book import FictionBook
-from file_processor import FileProcessor
+from parser.sources import open_text_source
+from file_processor import FileProcessor, BATCH_MODE, STREAM_MODE
 import re
-from nltk import sent_tokenize, word_tokenize
-from config.settings import CUSTOM_PUNCTUATION_SYMBOLS, PUNCTUATION_SYMBOLS, SPEECH_PARTS
-from pymorphy2 import MorphAnalyzer
+import hashlib
+import inspect
+import nltk
+from config.settings import CUSTOM_PUNCTUATION_SYMBOLS, PUNCTUATION_SYMBOLS, SPEECH_PARTS, POS_TAGGING_STRATEGY, \
+    POS_TAGGING_WORKERS, TOKENIZER_BACKEND, NGRAMM_ORDERS, DENSE_NGRAMMS_ARRAY
+from nlp import punctuation, tokenizers
+from parser import archive, fiction_book, sources, text_source
+from parser.pyfb2 import body, common, fb2
+from nlp.punctuation import get_punctuation_engine
+from nlp.tokenizers import get_tokenizer
+from nlp.morphology import get_pos_cache, warm_up, tag_sentence, tag_by_tokens, tag_by_vocabulary, tag_shard, \
+    NOPOS, NONE
+from nlp.speech_parts import SpeechParts
+from nlp.ngramms import HAS_NUMPY, MAIN_ORDER, count_ngramms, order_name, order_span
+from nlp.vocabulary import SPEECH_PARTS_VOCABULARY, PUNCTUATION_VOCABULARY
+from nlp.vocabulary_store import get_vocabulary_store
 from db.models import DataBaseConnection, Text
+from multiprocessing import Pool
 import time
 
 logger = logging.getLogger('harold.text_processor')
 
+# Ссылки на дополнительные элементы (картинки, переводы): [*]
+_BRACKETS = re.compile('[[].*?]')
+
+_cleaning_rules_version = None
+
+# Модули извлечения текста из источников: их изменение меняет текст, который попадает в кэш
+EXTRACTION_MODULES = (body, common, fb2, archive, fiction_book, sources, text_source)
+
+# Части речи, которые можно указать в ответах на конфликты морфологии
+ANSWER_SPEECH_PARTS = frozenset(SPEECH_PARTS + [NONE])
+
+
+def _iter_lines(text):
+    """Отдает строки текста по одной, не создавая списка всех строк"""
+    start = 0
+    end = text.find('\n')
+    while end >= 0:
+        yield text[start:end]
+        start = end + 1
+        end = text.find('\n', start)
+    yield text[start:]
+
+
+def cleaning_rules_version():
+    """Версия правил очистки и токенизации текста для кэша (см. TextProcessor._clean_and_tokenize)
+
+    Вычисляется по исходному коду модулей извлечения текста (EXTRACTION_MODULES), методов очистки,
+    модулей nlp.punctuation и nlp.tokenizers, выбранному токенизатору, списку знаков пунктуации
+    и версии nltk, поэтому записи кэша устаревают при любом их изменении
+    """
+    global _cleaning_rules_version
+    if _cleaning_rules_version is None:
+        sha = hashlib.sha256()
+        for module in EXTRACTION_MODULES:
+            sha.update(inspect.getsource(module))
+        for method in TextProcessor.CLEANING_METHODS:
+            sha.update(inspect.getsource(getattr(TextProcessor, method)))
+        sha.update(_BRACKETS.pattern)
+        sha.update(inspect.getsource(punctuation))
+        sha.update(repr(CUSTOM_PUNCTUATION_SYMBOLS))
+        sha.update(repr(PUNCTUATION_SYMBOLS))
+        sha.update(inspect.getsource(tokenizers))
+        sha.update(TOKENIZER_BACKEND)
+        sha.update(nltk.__version__)
+        _cleaning_rules_version = sha.hexdigest()
+    return _cleaning_rules_version
+
 
 class TextProcessor(object):
 
-    def __init__(self, filename):
+    # Методы, результат которых сохраняется в кэш очищенных текстов
+    CLEANING_METHODS = ('_iter_clean_paragraphs', '_remove_and_replace_symbols',
+                        '_tokenize_sentence', '_split_into_tokens')
+
+    def __init__(self, filename, stream=False):
 
-        self.file = FictionBook(filename)
+        self.filename = filename
+        self.file = open_text_source(filename, stream=stream)
         self.file_processor = FileProcessor(self.file.book_code_name)
         self.sentences = []
         self.sentences_count = 0
         self.words = []
         self.words_count = 0
-        self.speech_parts = []
-        self._punctuation_symbols = None
+        self.speech_parts = SpeechParts()
+        # Позиции (s, w) слов, часть речи которых не определена (см. _resolve_conflicts)
+        self.conflict_index = set()
+        self._punctuation_engine = None
+        self._tokenizer = None
         # Статистические словари
         self._punctuation = {}
         self._pos = {}
-        self._ngramm = {}
-        # Список N-грамм
-        self._ngramm_list = []
+        # Счетчики N-грамм текста по порядкам {<порядок>: {<N-грамма>: <кол-во>}}
+        self.ngramms = dict((order, {}) for order in NGRAMM_ORDERS)
+        # Общие словари N-грамм всех текстов по порядкам
+        self._ngramm_vocabularies = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer()
+        return self._tokenizer
 
     @property
-    def punctuation_symbols(self):
-        if self._punctuation_symbols is None:
-            self._punctuation_symbols = CUSTOM_PUNCTUATION_SYMBOLS
-        return self._punctuation_symbols
+    def punctuation_engine(self):
+        if self._punctuation_engine is None:
+            self._punctuation_engine = get_punctuation_engine()
+        return self._punctuation_engine
 
     @property
     def punctuation(self):
         if not bool(self._punctuation):
-            for symbol in PUNCTUATION_SYMBOLS:
-                self._punctuation.update({symbol: 0})
+            self._punctuation = self.punctuation_engine.new_counts()
         return self._punctuation
 
     @property
@@ -67,30 +142,56 @@ class TextProcessor(object):
         return self._pos
 
     @property
-    def ngramm_list(self):
-        if not self._ngramm_list:
-            self._ngramm_list = self.file_processor.load_ngramm_from_pickle()
-        return self._ngramm_list
+    def ngramm_vocabularies(self):
+        if self._ngramm_vocabularies is None:
+            self._ngramm_vocabularies = dict((order, get_vocabulary_store(order_name(order)).load())
+                                             for order in NGRAMM_ORDERS)
+        return self._ngramm_vocabularies
+
+    @property
+    def ngramm_vocabulary(self):
+        return self.ngramm_vocabularies[MAIN_ORDER]
 
     @property
     def ngramm(self):
-        if not bool(self._ngramm):
-            for item in self.ngramm_list:
-                self._ngramm.update({item: 0})
-        return self._ngramm
-
-    def _process_word(self, word):
-        """Разрешает конфликты внутри слова, когда парсер не может отделить
-        некотрые знаки пунктуации от слова в основном: кавычки и многоточия
-
-        будет использован список self.punctuation_symbols"""
-        _clean_word = ''
-        for symbol in word:
-            if symbol not in self.punctuation_symbols:
-                _clean_word += symbol
-            else:
-                self._punctuation[symbol] += 1
-        return _clean_word
+        return self.ngramms[MAIN_ORDER]
+
+    def _iter_clean_paragraphs(self, text, text_len):
+        """Очищает текст по одному параграфу (см. _remove_and_replace_symbols)
+        и отдает непустые очищенные параграфы.
+
+        В text_len накапливаются длины текста после каждого шага очистки - такие же,
+        какие получились бы при последовательной обработке всего текста целиком.
+        Параграфы книг fb2 приходят без обрамления '\t' (см. MainTag.iter_paragraphs), поэтому
+        длины 'raw', 'brackets' и 'tabs' для них меньше, чем при разборе прежнего to_text()
+        (kolokol.fb2: 875309/874762/874762 против 881506/880959/874855); длина 'clean' не изменилась
+        """
+        if isinstance(text, basestring):
+            text = [text]
+
+        separator = 0
+        for chunk in text:
+            if not isinstance(chunk, unicode):
+                # lxml отдает строки только из ASCII символов как str
+                chunk = chunk.decode('utf-8')
+            for paragraph in _iter_lines(chunk):
+                text_len['raw'] += len(paragraph) + separator
+
+                paragraph = _BRACKETS.sub('', paragraph)
+                text_len['brackets'] += len(paragraph) + separator
+
+                paragraph = paragraph.replace('\t', '')
+                text_len['tabs'] += len(paragraph) + separator
+                separator = 1
+
+                if len(paragraph) > 0 and not paragraph.isnumeric():
+                    paragraph = paragraph.strip()
+                    if not paragraph:
+                        continue
+                    if paragraph[-1].isalpha():
+                        paragraph += '.'
+                    text_len['clean'] += len(paragraph) + (1 if text_len['clean'] else 0)
+                    yield paragraph
 
     def _remove_and_replace_symbols(self, text):
         """
@@ -101,7 +202,7 @@ class TextProcessor(object):
         присутсвуют следующие лишние символы:
 
             -   [*], где * - это число      // ссылки на дополнительные элементы (картинки, переводы)
-            -   \t                          // символы табуляции, отделяющие параграфы (тэги <p>)
+            -   \t                          // символы табуляции (параграфы fb2 отдаются уже без них)
             -   обазначение "глав" книги    // числа окруженные знаком '\n'
 
         Из-за ошибок и неточностей верстки набивки текста могут быть следующие ситуации:
@@ -122,28 +223,13 @@ class TextProcessor(object):
 
             3) удалить из текста все символы '\n'
 
-        """
-        text_len = {}
-        text_len.update({"raw": len(text)})
-
-        text = re.sub('[[].*?]', '', text)
-        text_len.update({"brackets": len(text)})
-
-        text = text.replace('\t', '')
-        text_len.update({"tabs": len(text)})
+        Все шаги выполняются за один проход по параграфам текста, поэтому text может быть
+        как строкой, так и потоком параграфов (например, TextSource.iter_paragraphs())
 
-        paragraphs = text.split('\n')
-        clean_paragraphs = []
-
-        for p in range(len(paragraphs)):
-            if len(paragraphs[p]) > 0 and not paragraphs[p].isnumeric():
-                paragraphs[p] = paragraphs[p].strip()
-                if paragraphs[p][-1].isalpha():
-                    paragraphs[p] += '.'
-                clean_paragraphs.append(paragraphs[p])
+        """
+        text_len = dict.fromkeys(['raw', 'brackets', 'tabs', 'clean'], 0)
 
-        cleaned_text = ' '.join(clean_paragraphs)
-        text_len.update({"clean": len(cleaned_text)})
+        cleaned_text = ' '.join(self._iter_clean_paragraphs(text, text_len))
 
         logger.info('\n[Text cleaning] Resulting lengths:\n'
                     '\traw: {raw}\n'
@@ -153,53 +239,151 @@ class TextProcessor(object):
 
         return cleaned_text
 
+    def _tokenize_sentence(self, s, sentence):
+        """Разбирает предложение s на слова, попутно считая пунктуацию
+
+        Парсер не может отделить от слов некоторые знаки пунктуации, в основном
+        кавычки и многоточия, - они вырезаются из слов (см. nlp.punctuation)
+
+        Возвращает список слов и кол-во ошибок токенизации
+        """
+        _count = 0
+        clean_words = []
+        tokens = self.punctuation_engine.split(self.tokenizer.words(sentence), self.punctuation)
+        self.words_count += len(tokens)
+        for w, _word in enumerate(tokens):
+            _word = _word.lower()
+            clean_words.append(_word)
+            if not _word.isalpha() and '-' not in _word and not _word.isdigit():
+                _count += 1
+                logger.warn('Tokenization failure: {word}\n'
+                            '\t sentence ({n}, {m}):\n[ {sentence} ]\n'.format(word=_word.encode('utf-8'),
+                                                                               n=s,
+                                                                               m=w,
+                                                                               sentence=sentence.encode('utf-8')
+                                                                               )
+                            )
+
+        return clean_words, _count
+
     def _split_into_tokens(self, text):
         """Разбирает текст на предложения и слова, попутно решая возникающие конфликты и считающие пунтктуацию"""
 
-        self.sentences = sent_tokenize(text, language='russian')
+        self.sentences = self.tokenizer.sentences(text)
         _count = 0
         for s, sentence in enumerate(self.sentences):
             self.sentences_count += 1
-            _words = word_tokenize(sentence, language='russian')
-            clean_words = []
-            for w, _word in enumerate(_words):
-                if _word in self.punctuation:
-                    self.punctuation[_word] += 1
-                else:
-                    self.words_count += 1
-                    _word = self._process_word(_word).lower()
-                    clean_words.append(_word)
-                    if not _word.isalpha() and '-' not in _word and not _word.isdigit():
-                        _count += 1
-                        logger.warn('Tokenization failure: {word}\n'
-                                    '\t sentence ({n}, {m}):\n[ {sentence} ]\n'.format(word=_word.encode('utf-8'),
-                                                                                       n=s,
-                                                                                       m=w,
-                                                                                       sentence=sentence.encode('utf-8')
-                                                                                       )
-                                    )
-
+            clean_words, failures = self._tokenize_sentence(s, sentence)
+            _count += failures
             self.words.append(clean_words)
 
         return _count
 
+    def _iter_sentences(self, paragraphs):
+        """Разбивает поток очищенных параграфов на предложения
+
+        Предложение может не закончиться в конце параграфа, поэтому последнее
+        предложение каждого параграфа переносится в начало следующего
+        """
+        tail = ''
+        for paragraph in paragraphs:
+            text = ' '.join([tail, paragraph]) if tail else paragraph
+            sentences = self.tokenizer.sentences(text)
+            tail = sentences.pop() if sentences else ''
+            for sentence in sentences:
+                yield sentence
+        if tail:
+            yield tail
+
+    def _clean_and_tokenize(self):
+        """Очищает текст и разбирает его на предложения и слова.
+
+        Результат кэшируется по sha256 исходного файла и версии правил очистки,
+        поэтому повторная обработка той же книги не требует ни разбора файла, ни очистки
+        """
+        key = self.file.content_hash()
+        version = cleaning_rules_version()
+
+        cached = self.file_processor.load_text_cache(key, version)
+        if cached is not None:
+            self.sentences = cached['sentences']
+            self.sentences_count = len(self.sentences)
+            self.words = cached['words']
+            self.words_count = cached['words_count']
+            self._punctuation = cached['punctuation']
+            return cached['parsing_conflicts']
+
+        cleared_raw_text = self._remove_and_replace_symbols(self.file.iter_paragraphs())
+        parsing_conflicts = self._split_into_tokens(cleared_raw_text)
+
+        self.file_processor.save_text_cache(key, version, {'sentences': self.sentences,
+                                                           'words': self.words,
+                                                           'words_count': self.words_count,
+                                                           'punctuation': self.punctuation,
+                                                           'parsing_conflicts': parsing_conflicts})
+        return parsing_conflicts
+
+    def _read_answers(self, filename):
+        """Ответы на конфликты из csv файла: (<часть речи>, <индекс-предложения>, <индекс-слова>, <слово>)
+
+        Оставляются только ответы с частью речи из SPEECH_PARTS или 'NONE': неразрешенные
+        конфликты ('NOPOS') пропускаются, а строки с неизвестной частью речи (например, опечаткой)
+        записываются в лог и не попадают ни в текст, ни в лексикон
+        """
+        answers = []
+        for pos, s, w, word in self.file_processor.read_conflicts_from_csv(filename):
+            if pos in ANSWER_SPEECH_PARTS:
+                answers.append((pos, s, w, word))
+            elif pos != NOPOS:
+                logger.error('\nUnknown part of speech "{pos}" for word "{word}" ({s}, {w}) was skipped: {file}'.format(
+                    pos=pos.encode('utf-8'), word=word.encode('utf-8'), s=s, w=w, file=filename))
+        return answers
+
+    def _check_conflicts_mode(self, filename, mode):
+        """Проверяет, что файл конфликтов записан в режиме mode: в другом режиме
+        предложения могут быть разбиты иначе, и ответы попали бы не на свои слова"""
+        found = self.file_processor.conflicts_mode(filename)
+        if found != mode:
+            logger.error('\nConflicts file was written in {found} mode and can not be applied '
+                         'in {mode} mode: {file}'.format(found=found, mode=mode, file=filename))
+            return False
+        return True
+
     def _resolve_conflicts(self, filename):
         """Заменяет элменты со значением 'NOPOS' в массиве self.speech_parts,
         считав информацию из указанного файла
+
+        Меняются только позиции из self.conflict_index, поэтому разрешение
+        занимает время, пропорциональное кол-ву конфликтов, а не длине текста.
+        Слова, признанные лишними ('NONE'), остаются на своих местах и пропускаются
+        при подсчете N-грамм - индексы (s, w) не сдвигаются, и файл с ответами
+        можно применять по частям. Файлы потокового режима не принимаются
         """
-        resolved_conflicts = self.file_processor.read_conflicts_from_csv(filename)
+        if not self._check_conflicts_mode(filename, BATCH_MODE):
+            return False
 
-        # Разрешить те конфликты, которые можно разрешить
-        for item in resolved_conflicts:
-            self.speech_parts[item[1]][item[2]] = item[0]
-            if item[0] != u'NONE':
-                self.pos[item[0]] += 1
+        resolved_conflicts = self._read_answers(filename)
+        morph = get_pos_cache()
 
-        # Удалить признанное лишним
-        res = []
-        for item in self.speech_parts:
-            res.append(filter(lambda w: w != u'NONE', item))
-        self.speech_parts = res
+        # Разрешить те конфликты, которые можно разрешить
+        skipped = 0
+        for pos, s, w, word in resolved_conflicts:
+            if (s, w) not in self.conflict_index:
+                # Конфликт уже разрешен или индексы не относятся к тексту
+                skipped += 1
+                continue
+
+            self.speech_parts.set(s, w, pos)
+            self.conflict_index.discard((s, w))
+            if pos != NONE:
+                self.pos[pos] += 1
+            # Ответ запоминается в лексиконе и пригодится для следующих книг
+            morph.learn(word, pos)
+        morph.save()
+
+        if skipped:
+            logger.warn('\n{n} answers were skipped as already resolved or unknown: {file}'.format(n=skipped,
+                                                                                                file=filename))
 
         result = self._check_for_conflicts()
 
@@ -210,122 +394,349 @@ class TextProcessor(object):
 
         return result
 
-    def _define_part_of_speech(self):
-        """Проходит по тексту и определяет части речи каждого слова"""
+    def _define_part_of_speech_in_pool(self, strategy, morph, workers):
+        """Делит текст на workers непрерывных диапазонов предложений и определяет
+        части речи в пуле процессов. Результаты диапазонов объединяются по порядку,
+        поэтому совпадают с результатом последовательной обработки; счетчики кэшей
+        процессов пула добавляются к счетчикам morph"""
         conflicts = dict()
-        morph = MorphAnalyzer()
+        shard_size = (self.sentences_count + workers - 1) // workers
+        shards = [(offset, self.words[offset:offset + shard_size], strategy)
+                  for offset in range(0, self.sentences_count, shard_size)]
+
+        # Словари pymorphy2 загружаются до fork и остаются общими для всех процессов
+        warm_up()
+        pool = Pool(processes=workers)
+        try:
+            results = pool.map(tag_shard, shards)
+        finally:
+            pool.close()
+            pool.join()
+
         _count = 0
-        for s in range(self.sentences_count):
-
-            _sentence_pos = []
-            for w in range(len(self.words[s])):
-
-                word = self.words[s][w]
-                m = morph.parse(word)
-
-                if m[0].tag.POS is None:
-                    _sentence_pos.append('NOPOS')
-                    _count += 1
-                    if word not in conflicts:
-                        conflicts.update(
-                            {
-                                word: {
-                                    'speech_part': u'NOUN',
-                                    'indicies': [(s, w)]
-                                    }
-                            })
-                    else:
-                        conflicts[word]['indicies'].append((s, w))
+        for speech_parts, pos, shard_conflicts, nopos, stats in results:
+            morph.add_stats(stats)
+            self.speech_parts.extend(speech_parts)
+            for item in pos:
+                self.pos[item] += pos[item]
+            for word in shard_conflicts:
+                if word not in conflicts:
+                    conflicts[word] = shard_conflicts[word]
                 else:
-                    _sentence_pos.append(m[0].tag.POS.__str__())
-                    self.pos[m[0].tag.POS.__str__()] += 1
-            self.speech_parts.append(_sentence_pos)
+                    conflicts[word]['indicies'].extend(shard_conflicts[word]['indicies'])
+            _count += nopos
+
+        return conflicts, _count
+
+    def _define_part_of_speech(self, strategy=POS_TAGGING_STRATEGY, morph=None, workers=POS_TAGGING_WORKERS):
+        """Проходит по тексту и определяет части речи каждого слова
+
+        strategy - 'vocabulary' (каждая уникальная словоформа анализируется один раз)
+        или 'tokens' (каждое слово текста по очереди); результат у них одинаковый
+
+        При workers > 1 текст делится на диапазоны предложений, которые обрабатываются
+        в пуле процессов (см. _define_part_of_speech_in_pool)
+        """
+        if morph is None:
+            morph = get_pos_cache()
+        morph.reset_stats()
+
+        if workers > 1 and self.sentences_count > workers:
+            conflicts, _count = self._define_part_of_speech_in_pool(strategy, morph, workers)
+        else:
+            conflicts = dict()
+            if strategy == 'tokens':
+                speech_parts, _count = tag_by_tokens(self.words, morph, conflicts, self.pos)
+            else:
+                speech_parts, _count = tag_by_vocabulary(self.words, morph, conflicts, self.pos)
+            self.speech_parts.extend(speech_parts)
+            morph.save()
+
+        self.conflict_index = set((s, w) for word in conflicts for s, w in conflicts[word]['indicies'])
 
         logger.info('\n[MORPH] Words were proceeded with pymorph:\n'
                     '\tTotal words in text: {words}\n'
                     '\tTotal sentences in text: {sent}\n'
                     '\tTotal words with no POS determined: {confl}\n'
-                    '\tUnique words with no POS : {un}'.format(words=self.words_count,
-                                                               sent=self.sentences_count,
-                                                               confl=_count,
-                                                               un=len(conflicts)))
+                    '\tUnique words with no POS : {un}\n'
+                    '\tPOS cache hits: {hits}, misses: {misses}, lexicon hits: {lex}'.format(
+                        words=self.words_count,
+                        sent=self.sentences_count,
+                        confl=_count,
+                        un=len(conflicts),
+                        hits=morph.hits,
+                        misses=morph.misses,
+                        lex=morph.lexicon_hits))
 
         return conflicts
 
     def _check_for_conflicts(self):
         """Проверяет массив self.speech_parts на наличие записи 'NOPOS'
-        """
-        res = True
-        for s, sentence in enumerate(self.speech_parts):
-            for w, word in enumerate(sentence):
-                if word == u'NOPOS':
-                    res = False
-                if word == u'NONE':
-                    res = False
-
-        return res
 
-    def _add_ngramm(self, _ngramm):
-        """Добавляет N-грамму в словарь self.ngramm и в список self.ngramm_list"""
-        if _ngramm in self.ngramm:
-            self.ngramm[_ngramm] += 1
-        else:
-            self.ngramm.update({_ngramm: 1})
-            self.ngramm_list.append(_ngramm)
-
-    def _make_statistic_array(self, _dict, _const_list):
+        Проверяются только позиции из self.conflict_index
+        """
+        for s, w in self.conflict_index:
+            if self.speech_parts.get(s, w) == NOPOS:
+                return False
+        return True
+
+    def _build_conflict_index(self):
+        """Собирает позиции конфликтов полным проходом по тексту (для pickle-файлов без индекса)"""
+        self.conflict_index = set(self.speech_parts.find(NOPOS))
+
+    def _add_ngramm(self, _ngramm, count=1, order=MAIN_ORDER):
+        """Добавляет N-грамму порядка order в счетчики self.ngramms и в общий словарь этого порядка"""
+        self.ngramm_vocabularies[order].add(_ngramm)
+        counts = self.ngramms[order]
+        counts[_ngramm] = counts.get(_ngramm, 0) + count
+
+    def _make_statistic_array(self, _dict, vocabulary):
         """Структура данных языка python dict работает по принципу хэш-таблиц,
         поэтому порядок следования ключей, необходимый в массиве статистических данных, не гарантирован
 
-        Для этого в соответствии с константами, заданными в файле settings.py, строятся массивы (списки),
+        Для этого в соответствии со словарем признаков (см. nlp.vocabulary) строятся массивы (списки),
         соблюдение последоваетльности элементов в которых - гарантировано, для дальнейшего сохранения
         этих векторов признаков в БД, для дальнейших исследований
         """
-        result = [0] * len(_const_list)
-        for item in _dict:
-            index = _const_list.index(item)
-            result[index] = int(_dict[item])
-
-        return result
+        return vocabulary.make_vector(_dict)
 
     def _save_text_to_db(self, book_id, author_id):
         """Сохраняет собранные статистики в БД Harold"""
 
+        # N-граммы всех порядков сохраняются разреженно (таблица text_ngramms), поэтому объем
+        # записи зависит от кол-ва различных N-грамм текста, а не от размера общих словарей
+        sparse_vectors = dict((order_name(order), self.ngramm_vocabularies[order].make_sparse(self.ngramms[order]))
+                              for order in NGRAMM_ORDERS)
+        ngramms_array = None
+        if DENSE_NGRAMMS_ARRAY:
+            ngramms_array = self._make_statistic_array(self.ngramm, self.ngramm_vocabulary)
+
         dbc = DataBaseConnection()
         _text_id = dbc.get_id(Text)
         text = Text(id=_text_id,
                     book_id=book_id,
                     author_id=author_id,
-                    ngramms_array=self._make_statistic_array(self.ngramm, self.ngramm_list),
-                    parts_array=self._make_statistic_array(self.pos, SPEECH_PARTS),
-                    punct_array=self._make_statistic_array(self.punctuation, PUNCTUATION_SYMBOLS),
+                    ngramms_array=ngramms_array,
+                    ngramms_size=len(self.ngramm_vocabulary),
+                    parts_array=self._make_statistic_array(self.pos, SPEECH_PARTS_VOCABULARY),
+                    punct_array=self._make_statistic_array(self.punctuation, PUNCTUATION_VOCABULARY),
                     code_name=self.file.book_code_name
                     )
-        dbc.create_or_update(text)
+        _text_id = dbc.create_or_update(text)
+        dbc.replace_text_ngramms(_text_id, sparse_vectors)
         dbc.close_session()
 
-    def _collect_ngramms(self):
-        """Собирает частеречевые N-граммы
-        """
+    def _count_ngramms(self, orders=NGRAMM_ORDERS):
+        """Считает частеречевые N-граммы текста всех порядков orders, не обращаясь к общим словарям N-грамм
 
+        При наличии NumPy N-граммы считаются по числовым кодам за один проход (см. nlp.ngramms)
+
+        Возвращает словарь {<порядок>: [(<N-грамма>, <кол-во>), ...]}, пары идут
+        в порядке первого появления N-граммы в тексте
+        """
+        if HAS_NUMPY:
+            return count_ngramms(self.speech_parts, orders)
+        return self._count_ngramms_by_sentences(orders)
+
+    def _count_ngramms_by_sentences(self, orders=NGRAMM_ORDERS):
+        """Подсчет N-грамм без NumPy - строка каждой N-граммы создается заново"""
+        counts = {}
+        appearance = {}
         for s, sentence in enumerate(self.speech_parts):
+            self._count_sentence_ngramms(sentence, counts, appearance, orders)
+
+        return self._ordered_ngramms(counts, appearance, orders)
+
+    def _count_sentence_ngramms(self, sentence, counts, appearance, orders=NGRAMM_ORDERS):
+        """Добавляет N-граммы предложения в словари counts[<порядок>], новые N-граммы - в списки appearance[<порядок>]"""
+        if NONE in sentence:
+            sentence = [pos for pos in sentence if pos != NONE]
+        for order in orders:
+            step = order[1] + 1
+            span = order_span(order)
+            _counts = counts.setdefault(order, {})
+            _appearance = appearance.setdefault(order, [])
+            for w in range(len(sentence) - span + 1):
+                _ngramm = '-'.join(sentence[w:w + span:step])
+                if _ngramm in _counts:
+                    _counts[_ngramm] += 1
+                else:
+                    _counts[_ngramm] = 1
+                    _appearance.append(_ngramm)
 
-            if len(sentence) >= 3:
-                for w in range(len(sentence)-2):
-                    _ngramm = '-'.join([sentence[w], sentence[w+1], sentence[w+2]])
-                    self._add_ngramm(_ngramm)
+    def _ordered_ngramms(self, counts, appearance, orders=NGRAMM_ORDERS):
+        """Пары (<N-грамма>, <кол-во>) каждого порядка в порядке первого появления"""
+        return dict((order, [(_ngramm, counts[order][_ngramm]) for _ngramm in appearance.get(order, [])])
+                    for order in orders)
 
-        self.file_processor.save_ngramm_to_pickle(self.ngramm_list)
+    def _collect_ngramms(self, ngramms=None):
+        """Собирает частеречевые N-граммы всех порядков
+
+        ngramms - уже посчитанные пары (<N-грамма>, <кол-во>) по порядкам, см. _count_ngramms
+        """
+        if ngramms is None:
+            ngramms = self._count_ngramms()
+
+        for order, pairs in ngramms.iteritems():
+            for _ngramm, count in pairs:
+                self._add_ngramm(_ngramm, count, order)
+
+        # Номера новых N-грамм окончательны только после сохранения словарей (см. nlp.vocabulary_store)
+        for order in self.ngramm_vocabularies:
+            get_vocabulary_store(order_name(order)).save()
 
     def save_pickles(self):
         self.file_processor.save_speech_parts_to_pickle(self.speech_parts)
         self.file_processor.save_pos_to_pickle(self.pos)
         self.file_processor.save_punctuation_to_pickle(self.punctuation)
+        self.file_processor.save_conflict_index_to_pickle(self.conflict_index)
 
     def load_pickles(self):
         self.speech_parts = self.file_processor.load_speech_parts_from_pickle()
+        if isinstance(self.speech_parts, list):
+            # pickle-файл прежнего формата - списки строк
+            self.speech_parts = SpeechParts.from_lists(self.speech_parts)
         self._pos = self.file_processor.load_pos_from_pickle()
         self._punctuation = self.file_processor.load_punctuation_from_pickle()
+        self.conflict_index = self.file_processor.load_conflict_index_from_pickle()
+        if self.conflict_index is None:
+            self._build_conflict_index()
+
+    def batch_processing(self):
+        """Неинтерактивная обработка текста для пакетного режима (см. nlp.corpus):
+
+            + убрать из текста лишние символы и разбить его на слова
+            + определить части речи
+            + посчитать N-граммы, не трогая общий список N-грамм
+
+        Возвращает словарь со счетчиками, пригодный для передачи между процессами.
+        Если остались морфологические конфликты, они сохраняются в csv файл,
+        а книга откладывается до их разрешения (пункты меню 3 и 4)
+        """
+        result = {'source': self.filename,
+                  'code_name': self.file.book_code_name,
+                  'conflicts': None}
+
+        self._clean_and_tokenize()
+        # Книги уже обрабатываются в пуле процессов (см. nlp.corpus)
+        conflicts = self._define_part_of_speech(workers=1)
+
+        if conflicts:
+            self.save_pickles()
+            _, path = self.file_processor.save_conflicts_to_csv(conflicts, self.sentences)
+            result.update({'conflicts': path})
+            return result
+
+        result.update({'pos': dict(self.pos),
+                       'punctuation': dict(self.punctuation),
+                       'ngramm': self._count_ngramms()})
+        return result
+
+    def load_statistics(self, result, ngramm_vocabularies):
+        """Загружает счетчики, собранные batch_processing, и добавляет новые N-граммы
+        текста в общие словари ngramm_vocabularies {<порядок>: <словарь>} (словари дополняются на месте)"""
+        self._pos = result['pos']
+        self._punctuation = result['punctuation']
+        self._ngramm_vocabularies = ngramm_vocabularies
+        for order, pairs in result['ngramm'].iteritems():
+            for _ngramm, count in pairs:
+                self._add_ngramm(_ngramm, count, order)
+
+    def save_to_db(self):
+        """Сохраняет информацию о книге и собранные статистики в БД Harold"""
+        db_book_id, db_author_id = self.file.save_book_info_to_db()
+        self._save_text_to_db(db_book_id, db_author_id)
+
+    def _stream(self, answers):
+        """Потоковый конвейер: очистка -> предложения -> слова -> части речи -> N-граммы
+
+        Предложения проходят конвейер по одному и нигде не накапливаются: хранятся
+        только счетчики, конфликты и предложения, в которых они найдены.
+
+        Возвращает (N-граммы по порядкам в порядке первого появления, конфликты, предложения с конфликтами)
+        """
+        morph = get_pos_cache()
+        morph.reset_stats()
+        text_len = dict.fromkeys(['raw', 'brackets', 'tabs', 'clean'], 0)
+        conflicts = dict()
+        conflict_sentences = dict()
+        counts = {}
+        appearance = {}
+        _count = 0
+
+        paragraphs = self._iter_clean_paragraphs(self.file.iter_paragraphs(), text_len)
+        for s, sentence in enumerate(self._iter_sentences(paragraphs)):
+            self.sentences_count += 1
+            words, _ = self._tokenize_sentence(s, sentence)
+            _sentence_pos, nopos = tag_sentence(s, words, morph, conflicts, self.pos, answers)
+
+            if nopos:
+                _count += nopos
+                conflict_sentences[s] = sentence
+            else:
+                self._count_sentence_ngramms(_sentence_pos, counts, appearance)
+        morph.save()
+
+        logger.info('\n[STREAM] Text was proceeded in stream mode:\n'
+                    '\tRaw text length: {raw}\n'
+                    '\tCleaned text length: {clean}\n'
+                    '\tTotal words in text: {words}\n'
+                    '\tTotal sentences in text: {sent}\n'
+                    '\tTotal words with no POS determined: {confl}\n'
+                    '\tUnique words with no POS : {un}\n'
+                    '\tPOS cache hits: {hits}, misses: {misses}, lexicon hits: {lex}'.format(
+                        raw=text_len['raw'],
+                        clean=text_len['clean'],
+                        words=self.words_count,
+                        sent=self.sentences_count,
+                        confl=_count,
+                        un=len(conflicts),
+                        hits=morph.hits,
+                        misses=morph.misses,
+                        lex=morph.lexicon_hits))
+
+        return self._ordered_ngramms(counts, appearance), conflicts, conflict_sentences
+
+    def stream_text_processing(self, filenames=()):
+        """Сквозная потоковая обработка текста (пункты меню 1-4 за один проход)
+        с ограниченным расходом памяти, не зависящим от размера текста
+
+        Если в тексте есть морфологические конфликты, они записываются в csv файл,
+        а статистика не сохраняется. После разрешения конфликтов обработку нужно
+        повторить, передав все файлы с разрешенными конфликтами (filenames): разбор
+        детерминирован, поэтому индексы конфликтов при повторном проходе совпадают.
+        Файлы пакетного режима не принимаются: предложения в нем разбиваются иначе
+
+        Возвращает True, если статистика сохранена в БД
+        """
+        if not all([self._check_conflicts_mode(filename, STREAM_MODE) for filename in filenames]):
+            return False
+
+        answers = dict()
+        morph = get_pos_cache()
+        for filename in filenames:
+            for pos, s, w, word in self._read_answers(filename):
+                answers[(s, w)] = pos
+                morph.learn(word, pos)
+
+        ts = time.time()
+        ngramms, conflicts, conflict_sentences = self._stream(answers)
+        te = time.time()
+
+        print "\tSentences in text: {}".format(self.sentences_count)
+        print "\tWords in text: {}".format(self.words_count)
+        print "\tTime taken: {} s".format(te - ts)
+        print
+
+        if conflicts:
+            morph_conflicts, path = self.file_processor.save_conflicts_to_csv(conflicts, conflict_sentences,
+                                                                                  STREAM_MODE)
+            print '\t{} conflicts were written to file: {}'.format(morph_conflicts, path)
+            return False
+
+        self._collect_ngramms(ngramms)
+        self.save_to_db()
+        return True
 
     def main_text_processing(self):
         """
@@ -340,10 +751,7 @@ class TextProcessor(object):
             + сохранить новые N-граммы
         """
 
-        raw_text = self.file.text
-
-        cleared_raw_text = self._remove_and_replace_symbols(raw_text)
-        parsing_conflicts = self._split_into_tokens(cleared_raw_text)
+        parsing_conflicts = self._clean_and_tokenize()
 
         if parsing_conflicts > 0:
             print 'Parsing conflicts were detected {n},\n' \
@@ -367,15 +775,13 @@ class TextProcessor(object):
     def raw_text_processing(self):
         """Начало обработки - чистый текст + токенизация + проблемы с пунктуацией"""
 
-        raw_text = self.file.text
         print "\tText: {title}, ({code_name})".format(title=self.file.title.encode('utf-8'),
                                                       code_name=self.file.book_code_name.encode('utf-8'))
         print "\tAuthor: {}".format(self.file.author.encode('utf-8'))
         print
 
         ts = time.time()
-        cleared_raw_text = self._remove_and_replace_symbols(raw_text)
-        parsing_conflicts = self._split_into_tokens(cleared_raw_text)
+        parsing_conflicts = self._clean_and_tokenize()
         te = time.time()
 
         print "\tSentences in text: {}".format(self.sentences_count)
@@ -429,8 +835,7 @@ class TextProcessor(object):
 
         ts = time.time()
         self._collect_ngramms()
-        db_book_id, db_author_id = self.file.save_book_info_to_db()
-        self._save_text_to_db(db_book_id, db_author_id)
+        self.save_to_db()
         te = time.time()
 
         print "\tTime taken: {} s".format(te - ts)
@@ -0,0 +1,140 @@
+# coding: utf-8
+"""
+Модуль разбора текста на предложения и слова
+
+Токенизатор реализует два метода:
+
+    - sentences(text)   // список предложений текста
+    - words(sentence)   // список токенов предложения (слова и знаки пунктуации)
+
+Реализации (выбираются настройкой TOKENIZER_BACKEND):
+
+    - 'nltk'    // эталон: punkt + TreebankWordTokenizer, как nltk.word_tokenize
+    - 'regex'   // предложения - тот же punkt, слова - предкомпилированные выражения,
+                   повторяющие правила TreebankWordTokenizer, которые встречаются в русском тексте
+
+Модель punkt загружается один раз на процесс (get_tokenizer). Совпадение токенов
+'regex' с эталоном и скорость токенизаторов проверяются в benchmark.py
+"""
+
+import re
+import nltk
+from nltk.tokenize.treebank import TreebankWordTokenizer
+from config.settings import TOKENIZER_BACKEND
+
+LANGUAGE = 'russian'
+
+_tokenizers = {}
+
+
+class Tokenizer(object):
+    """Наследник должен реализовать words(); предложения выделяет модель punkt"""
+
+    def __init__(self, language=LANGUAGE):
+        self.language = language
+        self._punkt = nltk.data.load('tokenizers/punkt/{language}.pickle'.format(language=language))
+
+    def sentences(self, text):
+        return self._punkt.tokenize(text)
+
+    def words(self, sentence):
+        raise NotImplementedError
+
+
+class NltkTokenizer(Tokenizer):
+    """Эталонная реализация - то же, что nltk.word_tokenize(sentence, language)
+
+    Правила TreebankWordTokenizer общие для всех его экземпляров, и при импорте
+    nltk.tokenize они дополняются разбором кавычек «», “” и ‘’
+    """
+
+    def __init__(self, language=LANGUAGE):
+        super(NltkTokenizer, self).__init__(language)
+        self._treebank = TreebankWordTokenizer()
+
+    def words(self, sentence):
+        return [token for part in self.sentences(sentence) for token in self._treebank.tokenize(part)]
+
+
+# Символы, которые TreebankWordTokenizer может отделить от слова
+_SPECIAL = re.compile(u'[^\\w…—–*-]|--', re.UNICODE)
+
+# Символ слова: все, кроме пробелов и отделяемых знаков
+_WORD = u'(?:[^\\s;@#$%&?!()\\[\\]{}<>«“‘„»”’`:,."-]|[:,](?=\\d)|\\.(?!\\.\\.)|-(?!-))'
+
+_TOKEN = re.compile(u'|'.join([
+    u'\\.\\.\\.',                       # многоточие
+    u'--',                          # двойное тире
+    u'`+',                          # обратные кавычки
+    u'[;@#$%&?!()\\[\\]{}<>«“‘„»”’]',    # отдельные знаки и кавычки
+    u'(?<=[:,])[:,]' + _WORD + u'*',  # знак сразу после запятой или двоеточия не отделяется
+    u'[:,](?!\\d)',                  # запятая и двоеточие, кроме разделителей в числах
+    u'"',                           # кавычки заменяются на `` и \'\'
+    _WORD + u'+',                   # слово
+]), re.UNICODE)
+
+# Закрывающие скобки и кавычки, после которых отделяется точка в конце предложения
+_CLOSING = u'])}>"\'»”’ \t\n'
+
+# Апостроф перед однобуквенным словом
+_OPEN_SINGLE_QUOTE = re.compile(u"(?i)(')(?!re|ve|ll|m|t|s|d)(\\w)\\b", re.UNICODE)
+
+# Английские сокращения ('s, n't, ...) и апостроф в конце слова
+_CONTRACTION = re.compile(u"([^'])('[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T|')$", re.UNICODE)
+
+# Символы, после которых " считается открывающей кавычкой
+_OPENING = u' ([{<«“‘„`'
+
+
+class RegexTokenizer(Tokenizer):
+    """Разбирает предложение на токены за один проход предкомпилированного выражения
+
+    Слова без символов, которые TreebankWordTokenizer отделяет от слова (так у
+    большинства слов русского текста), берутся целиком после разбиения по пробелам
+    """
+
+    def words(self, sentence):
+        # Точка в конце предложения отделяется, даже если после нее стоят кавычки и скобки;
+        # направление кавычек после точки определяется до ее отделения (см. _OPENING)
+        end = len(sentence.rstrip(_CLOSING))
+        if end > 1 and sentence[end - 1] == u'.' and sentence[end - 2] != u'.':
+            sentence = u' '.join([sentence[:end - 1], sentence[end - 1:]])
+
+        tokens = []
+        start = 0
+        for chunk in sentence.split():
+            if _SPECIAL.search(chunk) is None:
+                tokens.append(chunk)
+                continue
+            previous = u' '
+            if u'"' in chunk:
+                # Открывающей считается только кавычка после обычного пробела
+                start = sentence.find(chunk, start)
+                if start > 0:
+                    previous = sentence[start - 1]
+                start += len(chunk)
+            for token in _TOKEN.findall(chunk):
+                if token == u'"':
+                    token = u'``' if previous in _OPENING else u"''"
+                elif u"'" in token:
+                    parts = _OPEN_SINGLE_QUOTE.sub(u'\\1 \\2', token).split()
+                    token = parts.pop()
+                    match = _CONTRACTION.search(token)
+                    if match is not None:
+                        parts.append(token[:match.start(2)])
+                        token = match.group(2)
+                    tokens.extend(parts)
+                tokens.append(token)
+                previous = token[-1]
+        return tokens
+
+
+BACKENDS = {'nltk': NltkTokenizer,
+            'regex': RegexTokenizer}
+
+
+def get_tokenizer(backend=TOKENIZER_BACKEND):
+    """Общий для процесса токенизатор, модель punkt загружается при первом обращении"""
+    if backend not in _tokenizers:
+        _tokenizers[backend] = BACKENDS[backend]()
+    return _tokenizers[backend]
@@ -0,0 +1,99 @@
+# coding: utf-8
+"""
+Модуль словаря признаков
+
+Вектор признаков текста (N-граммы, части речи, пунктуация) сохраняется в БД
+массивом, порядок элементов которого задается списком признаков. Vocabulary
+хранит этот список (номер -> признак) вместе со словарем (признак -> номер),
+поэтому номер признака находится за O(1), а вектор строится за один проход
+по счетчикам текста. Новые признаки добавляются только в конец, и номера
+уже известных признаков не меняются
+
+N-граммы хранятся разреженно - парами (<номер>, <кол-во>) только для признаков,
+встреченных в тексте (make_sparse), а плотный вектор восстанавливается при чтении (densify)
+
+Вектор, сохраненный при меньшем словаре, короче векторов новых текстов. Номера
+признаков не меняются, а новые признаки в старом тексте не встречались, поэтому
+при чтении такой вектор дополняется нулями до размера текущего словаря (pad_vector)
+"""
+
+from config.settings import SPEECH_PARTS, PUNCTUATION_SYMBOLS
+
+
+def densify(pairs, size=None):
+    """Плотный вектор длины size по парам (<номер>, <кол-во>);
+    по умолчанию - до последнего встреченного номера"""
+    pairs = list(pairs)
+    length = max(i for i, _ in pairs) + 1 if pairs else 0
+    if size is None:
+        size = length
+    elif size < length:
+        raise ValueError('Vector of {length} features does not fit vocabulary of {size}'.format(length=length,
+                                                                                               size=size))
+    result = [0] * size
+    for i, count in pairs:
+        result[i] = count
+    return result
+
+
+def pad_vector(vector, size=None):
+    """Вектор, дополненный нулями до длины size (по умолчанию - без изменений)"""
+    vector = list(vector or [])
+    if size is None:
+        return vector
+    if size < len(vector):
+        raise ValueError('Vector of {length} features does not fit vocabulary of {size}'.format(length=len(vector),
+                                                                                               size=size))
+    return vector + [0] * (size - len(vector))
+
+
+class Vocabulary(object):
+
+    def __init__(self, items=()):
+        self.items = []
+        self.index = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Номер признака; новый признак добавляется в конец словаря"""
+        i = self.index.get(item)
+        if i is None:
+            i = self.index[item] = len(self.items)
+            self.items.append(item)
+        return i
+
+    def make_vector(self, counts):
+        """Плотный вектор признаков по словарю счетчиков {<признак>: <кол-во>}"""
+        result = [0] * len(self.items)
+        for item, count in counts.iteritems():
+            result[self.index[item]] = int(count)
+        return result
+
+    def make_sparse(self, counts):
+        """Разреженный вектор: пары (<номер признака>, <кол-во>) по возрастанию номера"""
+        return sorted((self.index[item], int(count)) for item, count in counts.iteritems() if count)
+
+    def densify(self, pairs):
+        """Плотный вектор длины словаря по разреженному вектору"""
+        return densify(pairs, len(self.items))
+
+    def pad(self, vector):
+        """Плотный вектор, сохраненный при меньшем словаре, в длину словаря"""
+        return pad_vector(vector, len(self.items))
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+SPEECH_PARTS_VOCABULARY = Vocabulary(SPEECH_PARTS)
+PUNCTUATION_VOCABULARY = Vocabulary(PUNCTUATION_SYMBOLS)
@@ -0,0 +1,187 @@
+# coding: utf-8
+"""
+Модуль хранения общих словарей N-грамм на диске
+
+Словарь N-грамм одного порядка хранится в трех файлах папки NGRAMMS_FOLDER_PATH:
+
+    - ngramm<_порядок>.pkl   // снимок: Vocabulary (или список N-грамм прежнего формата)
+    - ngramm<_порядок>.log   // журнал: первая строка - размер снимка, далее по одной новой N-грамме в строке
+    - ngramm<_порядок>.lock  // блокировка (flock) на время чтения и дописывания журнала
+
+Номер N-граммы - ее позиция в снимке и журнале. Записи журнала только дописываются,
+а сжатие переносит их в снимок в том же порядке, поэтому номера, сохраненные в БД,
+не меняются. Сохранение дописывает в журнал только новые N-граммы, а не весь словарь.
+
+Несколько процессов могут пополнять словарь одновременно: при сохранении (save)
+под блокировкой сначала дочитываются N-граммы, добавленные другими процессами,
+и только затем дописываются свои. Номера еще не сохраненных N-грамм при этом
+могут сдвинуться, поэтому векторы текстов строятся после сохранения словаря
+"""
+
+import fcntl
+import logging
+import os
+import cPickle as pickle
+from contextlib import contextmanager
+from config.settings import NGRAMMS_FOLDER_PATH, NGRAMM_LOG_COMPACTION
+from nlp.vocabulary import Vocabulary
+
+logger = logging.getLogger('harold.vocabulary_store')
+
+_stores = {}
+
+
+class VocabularyStore(object):
+
+    def __init__(self, filename, compaction=NGRAMM_LOG_COMPACTION):
+        """filename - файл снимка *.pkl; журнал и блокировка лежат рядом с ним"""
+        self.snapshot_filename = filename
+        base = os.path.splitext(filename)[0]
+        self.log_filename = base + '.log'
+        self.lock_filename = base + '.lock'
+        self.compaction = compaction
+        self.vocabulary = Vocabulary()
+        self._loaded = False
+        # Заголовок журнала и позиция в нем, до которой записи уже прочитаны
+        self._header = None
+        self._offset = 0
+        # Кол-во N-грамм словаря, которые уже есть на диске
+        self._persisted = 0
+
+    @contextmanager
+    def _locked(self, operation=fcntl.LOCK_EX):
+        folder = os.path.dirname(self.lock_filename)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        lock = open(self.lock_filename, 'a')
+        try:
+            fcntl.flock(lock, operation)
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_filename):
+            return []
+        inp = open(self.snapshot_filename, 'rb')
+        obj = pickle.load(inp)
+        inp.close()
+        logger.info('[PICKLE] File was read: {file}'.format(file=self.snapshot_filename))
+        # pickle-файл прежнего формата - список N-грамм
+        return obj.items if isinstance(obj, Vocabulary) else list(obj)
+
+    def _read_new_items(self):
+        """N-граммы, записанные на диск после первых self._persisted (вызывается под блокировкой)
+
+        Обычно дочитывается только конец журнала; снимок читается при первой загрузке
+        и после сжатия журнала другим процессом (заголовок журнала при этом меняется)
+        """
+        header = None
+        tail = ''
+        if os.path.exists(self.log_filename):
+            log = open(self.log_filename, 'rb')
+            header = log.readline()
+            if self._loaded and header == self._header:
+                log.seek(self._offset)
+            tail = log.read()
+            self._offset = log.tell()
+            log.close()
+
+        items = [line.decode('utf-8') for line in tail.splitlines()]
+        if not self._loaded or header != self._header:
+            snapshot = self._read_snapshot()
+            if header is not None:
+                # Снимок мог быть записан при сжатии, прерванном до обновления журнала
+                snapshot = snapshot[:int(header)]
+            items = (snapshot + items)[self._persisted:]
+
+        self._header = header
+        self._loaded = True
+        return items
+
+    def load(self):
+        """Словарь с диска; при повторных вызовах - тот же объект без чтения файлов"""
+        if not self._loaded:
+            with self._locked(fcntl.LOCK_SH):
+                for item in self._read_new_items():
+                    self.vocabulary.add(item)
+            self._persisted = len(self.vocabulary)
+            print 'ngramm loaded:', len(self.vocabulary)
+        return self.vocabulary
+
+    def save(self):
+        """Дописывает в журнал новые N-граммы словаря
+
+        N-граммы, добавленные тем временем другими процессами, встают в словарь раньше
+        своих новых N-грамм, поэтому после сохранения номера совпадают с номерами на диске
+        """
+        vocabulary = self.vocabulary
+        with self._locked():
+            foreign = self._read_new_items()
+            pending = vocabulary.items[self._persisted:]
+            if foreign:
+                del vocabulary.items[self._persisted:]
+                for item in pending:
+                    del vocabulary.index[item]
+                for item in foreign:
+                    vocabulary.add(item)
+                pending = [item for item in pending if item not in vocabulary]
+                for item in pending:
+                    vocabulary.add(item)
+
+            if pending:
+                if self._header is None:
+                    self._header = '{size}\n'.format(size=len(vocabulary) - len(pending))
+                    log = open(self.log_filename, 'wb')
+                    log.write(self._header)
+                else:
+                    log = open(self.log_filename, 'ab')
+                log.write(''.join([item.encode('utf-8') + '\n' for item in pending]))
+                self._offset = log.tell()
+                log.close()
+            self._persisted = len(vocabulary)
+
+            if len(vocabulary) - int(self._header or 0) > self.compaction:
+                self._compact()
+
+        print 'ngramm saved:', len(vocabulary)
+        logger.info('[VOCABULARY] {new} new N-gramms were appended: {file}'.format(new=len(pending),
+                                                                                file=self.log_filename))
+
+    def _compact(self):
+        """Переносит журнал в снимок (вызывается под блокировкой)
+
+        Снимок и журнал пишутся во временные файлы и подменяют прежние атомарно;
+        снимок заменяется первым, а лишний хвост снимка отбрасывается по заголовку журнала
+        """
+        header = '{size}\n'.format(size=len(self.vocabulary))
+
+        output = open(self.snapshot_filename + '.tmp', 'wb')
+        pickle.dump(self.vocabulary, output, 2)
+        output.close()
+        os.rename(self.snapshot_filename + '.tmp', self.snapshot_filename)
+
+        output = open(self.log_filename + '.tmp', 'wb')
+        output.write(header)
+        output.close()
+        os.rename(self.log_filename + '.tmp', self.log_filename)
+
+        self._header = header
+        self._offset = len(header)
+        logger.info('[VOCABULARY] Log was compacted into snapshot: {file}'.format(file=self.snapshot_filename))
+
+
+def ngramm_filename(name='3'):
+    """Файл снимка общего словаря N-грамм порядка name (см. nlp.ngramms.order_name);
+    словарь триграмм хранится под прежним именем ngramm.pkl"""
+    if name == '3':
+        return '/'.join([NGRAMMS_FOLDER_PATH, 'ngramm.pkl'])
+    return '/'.join([NGRAMMS_FOLDER_PATH, 'ngramm_{name}.pkl'.format(name=name)])
+
+
+def get_vocabulary_store(name='3'):
+    """Общее для процесса хранилище словаря N-грамм порядка name"""
+    if name not in _stores:
+        _stores[name] = VocabularyStore(ngramm_filename(name))
+    return _stores[name]
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+Модуль для чтения книг fb2 прямо из zip архивов, без распаковки на диск:
+
+    - *.fb2.zip     // архив с одной книгой
+    - сборники      // архив со множеством книг *.fb2
+
+Книга внутри архива представлена объектом ZipMember, который можно передать
+в FictionBook (и TextProcessor) вместо пути к файлу
+"""
+
+import zipfile
+from contextlib import contextmanager
+
+FB2_EXTENSION = '.fb2'
+
+
+class ZipMember(object):
+    """Книга внутри zip архива
+
+    Каждый вызов open() открывает новый поток для чтения, поэтому книгу
+    можно читать несколько раз (например, сначала заголовок, затем текст).
+    open() - контекстный менеджер: на выходе из with закрываются и поток, и архив
+    """
+
+    def __init__(self, archive, name):
+        self.archive = archive
+        self.name = name
+
+    @contextmanager
+    def open(self):
+        with zipfile.ZipFile(self.archive) as z:
+            with z.open(self.name) as stream:
+                yield stream
+
+    def __str__(self):
+        return '/'.join([self.archive, self.name])
+
+
+def _fb2_names(archive):
+    with zipfile.ZipFile(archive) as z:
+        return [name for name in z.namelist() if name.lower().endswith(FB2_EXTENSION)]
+
+
+def iter_bundle(archive):
+    """Отдает по одной все книги *.fb2 из zip архива в порядке их следования"""
+    for name in _fb2_names(archive):
+        yield ZipMember(archive, name)
+
+
+def fb2_source(path):
+    """Для архива *.fb2.zip возвращает книгу внутри него,
+    в остальных случаях - переданный путь без изменений
+
+    Сборник из нескольких книг нужно обходить через iter_bundle
+    """
+    if isinstance(path, basestring) and zipfile.is_zipfile(path):
+        names = _fb2_names(path)
+        if not names:
+            raise ValueError('No {ext} files in archive: {path}'.format(ext=FB2_EXTENSION, path=path))
+        if len(names) > 1:
+            raise ValueError('{n} {ext} files in archive, use iter_bundle: {path}'.format(
+                n=len(names), ext=FB2_EXTENSION, path=path))
+        return ZipMember(path, names[0])
+    return path
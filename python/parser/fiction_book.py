@@ -8,19 +8,28 @@
 Описание формата приведено на официальном сайте http://www.fictionbook.org/index.php
 """
 
+import os
 from pyfb2.fb2 import PyFb2, PublishInfo
 from pyfb2.body import TagBody, MainTag, TagP, TAGS
-from db.models import DataBaseConnection, Author, Book
-from transliterate import translit
+from archive import fb2_source, iter_bundle
+from text_source import TextSource
 
 
-class FictionBook(PyFb2):
+class FictionBook(PyFb2, TextSource):
 
-    def __init__(self, path_to_file):
+    def __init__(self, path_to_file, stream=False):
+        """При stream=True дерево документа не строится и не хранится:
+        текст книги разбирается потоково (см. PyFb2.iterparse_paragraphs),
+        а метаинформация читается только из <description> (см. PyFb2._get_header)
 
-        super(FictionBook, self).__init__(fpath=path_to_file)
+        path_to_file может указывать на архив *.fb2.zip или быть книгой
+        внутри архива (см. parser.archive)
+        """
+
+        super(FictionBook, self).__init__(fpath=fb2_source(path_to_file), header_only=stream)
+        self.stream = stream
         self._meta = dict()
-        self._document = self._get_tree()
+        self._document = None if stream else self._get_tree()
         self._author = None
         self._title = None
         self._genres = None
@@ -52,14 +61,21 @@ class FictionBook(PyFb2):
     @property
     def date(self):
         if self._date is None:
-            self._date = self.get_document_info().date
+            self._date = self.get_title_info().date or self.get_document_info().date
         return self._date
 
-    @property
-    def text(self):
-        if self._text is None:
-            self._text = TagP(self.root[1]).to_text()
-        return self._text
+    def iter_paragraphs(self):
+        """Лениво отдает параграфы текста книги, не собирая промежуточных строк"""
+        if self.stream:
+            return self.iterparse_paragraphs()
+        return TagBody(self.root[1]).iter_paragraphs()
+
+    def _open_files(self):
+        if hasattr(self.file, 'open'):
+            with self.file.open() as stream:
+                yield stream
+        else:
+            yield open(self.file, 'rb')
 
     @property
     def file_info(self):
@@ -73,17 +89,11 @@ class FictionBook(PyFb2):
             self._book_info = self._get_book_info()
         return self._book_info
 
-    @property
-    def book_code_name(self):
-        if self._book_code_name is None:
-            self._book_code_name = self.traslit(self.book_info['title'])
-        return self._book_code_name
-
-    @property
-    def author_code_name(self):
-        if self._author_code_name is None:
-            self._author_code_name = self.traslit(self.book_info['author'])
-        return self._author_code_name
+    @classmethod
+    def header(cls, path_to_file):
+        """Загружает только метаинформацию книги: разбор файла останавливается
+        на первом <body>, текст читается лишь при явном обращении к нему"""
+        return cls(path_to_file, stream=True)
 
     def _get_meta_info(self):
         res = {}
@@ -102,43 +112,37 @@ class FictionBook(PyFb2):
         return res
 
     def _get_url(self):
-        return self.file or self._document.docinfo.URL
+        return self.file or self.root.getroottree().docinfo.URL
 
     def _get_encoding(self):
-        return self._document.docinfo.encoding
+        return self.root.getroottree().docinfo.encoding
 
     def _get_root_name(self):
-        return self._document.docinfo.root_name
+        return self.root.getroottree().docinfo.root_name
 
     def _get_namespace(self):
         return self.root.nsmap
 
-    def traslit(self, word):
-        result = translit(word, 'ru', reversed=True).lower()
-        return result.replace(' ', '_')
 
-    def save_book_info_to_db(self):
-        """
-        Сохраняет информацию об обработанной книге и авторе в БД harold
-        """
-        dbc = DataBaseConnection()
-        _author_id = dbc.get_id(Author, code_name=self.author_code_name)
-        _book_id = dbc.get_id(Book, code_name=self.book_code_name)
-
-        author = Author(id=_author_id,
-                        name=self.book_info['author'],
-                        code_name=self.author_code_name
-                        )
-
-        book = Book(id=_book_id,
-                    title=self.book_info['title'],
-                    author_id=_author_id,
-                    genre=','.join(self.book_info['genres']),
-                    date=self.book_info['date'],
-                    code_name=self.book_code_name
-                    )
-
-        _author_id = dbc.create_or_update(author)
-        _book_id = dbc.create_or_update(book)
-        dbc.close_session()
-        return _book_id, _author_id
+def iter_books(folder):
+    """Обходит папку с библиотекой и отдает по одной все книги: пути к файлам *.fb2
+    и книги внутри zip архивов (см. parser.archive.iter_bundle)"""
+    for path, _, filenames in os.walk(folder):
+        for filename in sorted(filenames):
+            filename = os.path.join(path, filename)
+            if filename.endswith('.fb2'):
+                yield filename
+            elif filename.endswith('.zip'):
+                for member in iter_bundle(filename):
+                    yield member
+
+
+def iter_catalogue(folder):
+    """Обходит папку с библиотекой fb2 и для каждой книги отдает ее
+    метаинформацию, не разбирая текст:
+
+        (<путь к файлу>, <book_code_name>, <author_code_name>, <book_info>)
+    """
+    for source in iter_books(folder):
+        book = FictionBook.header(source)
+        yield book.file, book.book_code_name, book.author_code_name, book.book_info
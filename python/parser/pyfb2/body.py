@@ -31,29 +31,48 @@ class MainTag(Common):
                 continue
             self.add_tag(t)
 
-    def _to_text(self, text):
-        return text
+    # Обрамление текста тега: (перед текстом, после текста)
+    _text_wrap = ('', '')
+    _html_wrap = ('', '')
+
+    def _iter(self, wrap, method):
+        """Отдает фрагменты тега по порядку, не склеивая промежуточные строки"""
+        if wrap[0]:
+            yield wrap[0]
+        if self.root.text:
+            yield self.root.text.strip()
+        for tag in self._tags:
+            for fragment in getattr(tag, method)():
+                yield fragment
+        if wrap[1]:
+            yield wrap[1]
 
-    def to_text(self):
-        text = ''
+    def iter_text(self):
+        return self._iter(self._text_wrap, 'iter_text')
+
+    def iter_html(self):
+        return self._iter(self._html_wrap, 'iter_html')
+
+    def iter_paragraphs(self):
+        """Лениво отдает текст каждого параграфа <p> в порядке следования
+
+        Собственный текст тега вне <p> (например, <text-author>) отдается отдельным параграфом
+        """
+        text = self.root.text.strip() if self.root.text else ''
+        if text:
+            yield text
         for tag in self._tags:
-            text += tag.to_text()
-        if self.root.text:
-            return self._to_text(self.root.text.strip() + text)
-        else:
-            return self._to_text(text)
+            if isinstance(tag, TagP):
+                yield ''.join(tag._iter(MainTag._text_wrap, 'iter_text'))
+            else:
+                for paragraph in tag.iter_paragraphs():
+                    yield paragraph
 
-    def _to_html(self, text):
-        return text
+    def to_text(self):
+        return ''.join(self.iter_text())
 
     def to_html(self):
-        text = ''
-        for tag in self._tags:
-            text += tag.to_html()
-        if self.root.text:
-            return self._to_html(self.root.text.strip() + text)
-        else:
-            return self._to_html(text)
+        return ''.join(self.iter_html())
 
 
 class TagBody(MainTag):
@@ -81,19 +100,13 @@ class TagEpigraph(MainTag):
 
 
 class TagP(MainTag):
-    def _to_html(self, text):
-        return '<p>' + text + '</p>'
-
-    def _to_text(self, text):
-        return '\n\t' + text
+    _text_wrap = ('\n\t', '')
+    _html_wrap = ('<p>', '</p>')
 
 
 class TagEmptyLine(MainTag):
-    def _to_html(self, text):
-        return text + '<br/>'
-
-    def _to_text(self, text):
-        return text + '\n'
+    _text_wrap = ('', '\n')
+    _html_wrap = ('', '<br/>')
 
 
 class TagTextAuthor(MainTag):
@@ -109,11 +122,8 @@ class TagImage(MainTag):
 
 
 class TagTitle(MainTag):
-    def _to_html(self, text):
-        return '<H1>' + text + '</H1>'
-
-    def _to_text(self, text):
-        return '\n' + text + '\n'
+    _text_wrap = ('\n', '\n')
+    _html_wrap = ('<H1>', '</H1>')
 
 
 TAGS = {'body': TagBody,
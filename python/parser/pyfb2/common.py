@@ -1,4 +1,28 @@
 #-*-coding:utf8-*-
+from lxml import etree
+
+# Скомпилированные XPath выражения: (имена, пространства имен) -> etree.XPath
+_XPATH_CACHE = {}
+
+
+def compile_xpath(name, namespaces, descendant=True):
+    """Возвращает скомпилированное выражение для поиска элемента name
+    относительно переданного ему узла (только внутри его поддерева).
+
+    name может быть списком имен - тогда это путь вида a/b/c.
+    При descendant=False ищутся только прямые потомки узла.
+    """
+    if not isinstance(name, list):
+        name = [name]
+    key = (tuple(name), tuple(sorted(namespaces.items())), descendant)
+    xpath = _XPATH_CACHE.get(key)
+    if xpath is None:
+        if 'default' in namespaces:
+            name = ['default:%s' % n for n in name]
+        path = ('.//%s' if descendant else './%s') % '/'.join(name)
+        xpath = etree.XPath(path, namespaces=namespaces)
+        _XPATH_CACHE[key] = xpath
+    return xpath
 
 
 class Common(object):
@@ -24,17 +48,7 @@ class Common(object):
         return self._ns
 
     def get_element(self, name, mass=False):
-        if 'default' in self.namespace:
-            if isinstance(name, list):
-                name = '/'.join(['default:%s' % n for n in name])
-            else:
-                name = 'default:%s' % name
-            elem = self.root.xpath('//%s' % name,
-                    namespaces=self.namespace)
-        else:
-            if isinstance(name, list):
-                name = '/'.join(name)
-            elem = self.root.xpath('//%s' % name)
+        elem = compile_xpath(name, self.namespace)(self.root)
         if not mass:
             elem = None if not len(elem) > 0 else elem[0]
         return elem
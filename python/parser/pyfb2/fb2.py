@@ -1,14 +1,19 @@
 #-*-coding:utf8-*-
+from contextlib import contextmanager
 from lxml import etree
 from info import TitleInfo, PublishInfo, DocumentInfo
+from body import MainTag, TAGS
+from common import compile_xpath
 
 
 class PyFb2(object):
-    def __init__(self, fpath):
+    def __init__(self, fpath, header_only=False):
         self.file = fpath
+        self.header_only = header_only
         self._tree = None
         self._ns = None
         self._root = None
+        self._description = None
 
     def _get_tag_name(self, tag):
         name = tag.tag
@@ -16,16 +21,109 @@ class PyFb2(object):
             name = name.replace('{%s}' % ns, '')
         return name.strip()
 
+    @contextmanager
+    def _source(self):
+        """Путь к файлу или новый поток для чтения, если файл - это объект
+        с методом open() (например, книга внутри zip архива); поток закрывается на выходе из with"""
+        if hasattr(self.file, 'open'):
+            with self.file.open() as stream:
+                yield stream
+        else:
+            yield self.file
+
     def _get_tree(self):
         if not self._tree:
             parser = etree.XMLParser(ns_clean=True, recover=True)
-            self._tree = etree.parse(self.file, parser)
+            with self._source() as source:
+                self._tree = etree.parse(source, parser)
         return self._tree
 
+    def _get_header(self):
+        """Разбирает файл только до первого <body> и возвращает корень
+        частичного дерева, в котором есть лишь <description>.
+
+        Для чтения метаинформации не нужно разбирать и хранить текст книги,
+        поэтому разбор прекращается, как только начинается <body>.
+        """
+        with self._source() as source:
+            context = etree.iterparse(source, events=('start',), tag='{*}body',
+                                      recover=True, huge_tree=True)
+            for event, elem in context:
+                root = elem.getparent()
+                # Парсер мог успеть прочитать начало <body> - оно не нужно
+                del root[root.index(elem):]
+                return root
+            return context.root
+
+    def iterparse_paragraphs(self):
+        """Потоково разбирает файл через etree.iterparse и отдает текст
+        параграфов <p> первого <body> по мере их разбора.
+
+        Разобранные элементы сразу очищаются, поэтому расход памяти не зависит
+        от размера книги. Параграфы совпадают с MainTag.iter_paragraphs при
+        разборе полного дерева: учитываются только известные теги (TAGS),
+        параграфы внутри неизвестных тегов пропускаются, а собственный текст
+        известного тега вне <p> (например, <text-author>) отдается отдельным
+        параграфом перед параграфами вложенных тегов.
+        """
+        with self._source() as source:
+            context = etree.iterparse(source, events=('start', 'end'),
+                                      recover=True, huge_tree=True)
+            bodies = 0
+            # Открытые элементы первого <body>: [элемент, вид, текст уже отдан];
+            # вид - 'known' (известный тег), 'p' (параграф) или 'skip' (неизвестный тег и все внутри <p>)
+            stack = []
+            for event, elem in context:
+                if event == 'start':
+                    if bodies == 0 and self._get_tag_name(elem) == 'body':
+                        bodies += 1
+                        stack.append([elem, 'known', False])
+                    elif stack:
+                        parent = stack[-1]
+                        if parent[1] == 'known' and not parent[2]:
+                            # Текст тега закончился там, где начался первый вложенный тег
+                            parent[2] = True
+                            text = parent[0].text.strip() if parent[0].text else ''
+                            if text:
+                                yield text
+                        name = self._get_tag_name(elem)
+                        if parent[1] != 'known':
+                            kind = 'skip'
+                        elif name == 'p':
+                            kind = 'p'
+                        else:
+                            kind = 'known' if name in TAGS else 'skip'
+                        stack.append([elem, kind, False])
+                    continue
+
+                if not stack:
+                    continue
+
+                _, kind, done = stack.pop()
+                if kind == 'known' and not done:
+                    text = elem.text.strip() if elem.text else ''
+                    if text:
+                        yield text
+                elif kind == 'p':
+                    yield MainTag(elem).to_text()
+
+                if not stack:
+                    # Остальные <body> - это примечания, текст книги закончился
+                    break
+
+                if stack[-1][1] == 'known':
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+            del context
+
     @property
     def root(self):
         if self._root is None:
-            self._root = self._get_tree().getroot()
+            if self.header_only and self._tree is None:
+                self._root = self._get_header()
+            else:
+                self._root = self._get_tree().getroot()
         return self._root
 
     @property
@@ -39,12 +137,17 @@ class PyFb2(object):
             self._ns = nsmap
         return self._ns
 
+    @property
+    def description(self):
+        """Элемент <description> - вся метаинформация книги находится в нем"""
+        if self._description is None:
+            elem = compile_xpath('description', self.namespace,
+                                 descendant=False)(self.root)
+            self._description = elem[0] if len(elem) > 0 else self.root
+        return self._description
+
     def get_element(self, name, mass=False):
-        if 'default' in self.namespace:
-            elem = self.root.xpath('//default:%s' % name,
-                    namespaces=self.namespace)
-        else:
-            elem = self.root.xpath('//%s' % name)
+        elem = compile_xpath(name, self.namespace)(self.description)
         if not mass:
             elem = None if not len(elem) > 0 else elem[0]
         return elem
@@ -1,4 +1,5 @@
 #-*-coding:utf8-*-
+from common import compile_xpath
 
 
 class Info(object):
@@ -13,11 +14,7 @@ class Info(object):
         return name.strip()
 
     def get_element(self, name, mass=False):
-        if 'default' in self.namespace:
-            elem = self.root.xpath('//default:%s' % name,
-                    namespaces=self.namespace)
-        else:
-            elem = self.root.xpath('//%s' % name)
+        elem = compile_xpath(name, self.namespace)(self.root)
         if not mass:
             elem = None if not len(elem) > 0 else elem[0]
         return elem
@@ -45,6 +42,7 @@ class TitleInfo(Info):
         self._genres = None
         self._title = None
         self._lang = None
+        self._date = None
 
     @property
     def author(self):
@@ -87,6 +85,15 @@ class TitleInfo(Info):
             self._lang = lang
         return self._lang
 
+    @property
+    def date(self):
+        if self._date is None:
+            date = self.get_element('date')
+            if date is not None:
+                date = date.text
+            self._date = date
+        return self._date
+
 
 class DocumentInfo(Info):
     def __init__(self, root):
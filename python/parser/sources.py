@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Модуль содержит источники текста для TextProcessor, не требующие разбора XML:
+
+    - PlainText         // текстовый файл *.txt
+    - PartsDirectory    // папка с частями текста *_part_<номер>.txt
+
+Файлы читаются потоково, построчно - каждая строка считается параграфом.
+Корпуса в examples/text лежат в папках вида '<Название>. <Автор>':
+
+    examples/text/3comarad. Remark/original/3comarad.txt
+    examples/text/3comarad. Remark/parts_21_5000w/3comarad_part_<номер>.txt
+
+из имени такой папки берутся название книги и автор.
+
+Функция open_text_source выбирает источник по пути к файлу
+"""
+
+import io
+import os
+import re
+import sys
+from fiction_book import FictionBook
+from text_source import TextSource
+
+TEXT_ENCODING = 'utf-8-sig'
+TEXT_EXTENSION = '.txt'
+
+_PART_NUMBER = re.compile(r'(\d+)\D*$')
+
+
+def _decode(name):
+    if isinstance(name, unicode):
+        return name
+    return name.decode(sys.getfilesystemencoding() or 'utf-8')
+
+
+def _part_number(name):
+    number = _PART_NUMBER.search(os.path.splitext(name)[0])
+    return int(number.group(1)) if number else -1
+
+
+def _book_folder_info(folder):
+    """Название и автор из имени папки книги '<Название>. <Автор>',
+    в которой лежит папка folder (original или parts_*)"""
+    folder = _decode(os.path.basename(os.path.dirname(os.path.abspath(folder))))
+    if '. ' in folder:
+        title, author = folder.rsplit('. ', 1)
+        return title, author
+    return None, u''
+
+
+class PlainText(TextSource):
+
+    def __init__(self, path):
+        self.file = path
+        self._text = None
+        self._book_info = None
+        self._book_code_name = None
+        self._author_code_name = None
+
+    @property
+    def book_info(self):
+        if self._book_info is None:
+            title, author = _book_folder_info(os.path.dirname(os.path.abspath(self.file)))
+            self._book_info = {'author': author,
+                               'title': title or self.code_name,
+                               'genres': [],
+                               'date': None}
+        return self._book_info
+
+    @property
+    def code_name(self):
+        return _decode(os.path.splitext(os.path.basename(self.file))[0])
+
+    def _open_files(self):
+        yield io.open(self.file, 'rb')
+
+    def iter_paragraphs(self):
+        with io.open(self.file, 'r', encoding=TEXT_ENCODING) as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+
+class PartsDirectory(TextSource):
+    """Папка с частями одного текста, части читаются по порядку номеров"""
+
+    def __init__(self, path):
+        self.file = path.rstrip(os.sep)
+        self._text = None
+        self._book_info = None
+        self._book_code_name = None
+        self._author_code_name = None
+
+    @property
+    def parts(self):
+        names = [name for name in os.listdir(self.file) if name.endswith(TEXT_EXTENSION)]
+        names.sort(key=_part_number)
+        return [os.path.join(self.file, name) for name in names]
+
+    @property
+    def book_info(self):
+        if self._book_info is None:
+            title, author = _book_folder_info(self.file)
+            self._book_info = {'author': author,
+                               'title': title or _decode(os.path.basename(self.file)),
+                               'genres': [],
+                               'date': None}
+        return self._book_info
+
+    @property
+    def code_name(self):
+        return '_'.join([self.book_info['title'], _decode(os.path.basename(self.file))])
+
+    def _open_files(self):
+        for part in self.parts:
+            yield io.open(part, 'rb')
+
+    def iter_paragraphs(self):
+        for part in self.parts:
+            for paragraph in PlainText(part).iter_paragraphs():
+                yield paragraph
+
+
+def open_text_source(path, stream=False):
+    """Источник текста по пути: папка с частями, *.txt или книга fb2 (*.fb2, *.fb2.zip)"""
+    if isinstance(path, basestring):
+        if os.path.isdir(path):
+            return PartsDirectory(path)
+        if path.endswith(TEXT_EXTENSION):
+            return PlainText(path)
+    return FictionBook(path, stream=stream)
@@ -0,0 +1,117 @@
+# coding: utf-8
+"""
+Модуль содержит базовый класс источника текста для TextProcessor
+
+Источник отдает текст по параграфам (iter_paragraphs) и описывает книгу
+словарем book_info, по которому строятся кодовые имена и записи в БД harold.
+Реализации: FictionBook (*.fb2, *.fb2.zip), PlainText (*.txt)
+и PartsDirectory (папка с частями текста), см. parser.sources
+"""
+
+import hashlib
+from db.models import DataBaseConnection, Author, Book, get_connection
+from transliterate import translit
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class TextSource(object):
+    """Наследник должен реализовать iter_paragraphs(), _open_files() и свойство book_info:
+
+        {'author': <автор>, 'title': <название>, 'genres': [<жанры>], 'date': <дата>}
+
+    и завести атрибуты _text, _book_code_name и _author_code_name со значением None
+    """
+
+    def iter_paragraphs(self):
+        raise NotImplementedError
+
+    def _open_files(self):
+        """Отдает открытые на чтение (в байтах) файлы, из которых состоит текст"""
+        raise NotImplementedError
+
+    def content_hash(self):
+        """sha256 содержимого исходных файлов, читаемых по частям"""
+        sha = hashlib.sha256()
+        for f in self._open_files():
+            try:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            finally:
+                f.close()
+        return sha.hexdigest()
+
+    @property
+    def book_info(self):
+        raise NotImplementedError
+
+    @property
+    def title(self):
+        return self.book_info['title']
+
+    @property
+    def author(self):
+        return self.book_info['author']
+
+    @property
+    def code_name(self):
+        """Имя, из которого строится book_code_name"""
+        return self.book_info['title']
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = '\n'.join(self.iter_paragraphs())
+        return self._text
+
+    @property
+    def book_code_name(self):
+        if self._book_code_name is None:
+            self._book_code_name = self.traslit(self.code_name)
+        return self._book_code_name
+
+    @property
+    def author_code_name(self):
+        if self._author_code_name is None:
+            self._author_code_name = self.traslit(self.book_info['author'])
+        return self._author_code_name
+
+    def traslit(self, word):
+        result = translit(word, 'ru', reversed=True).lower()
+        return result.replace(' ', '_')
+
+    def is_saved_to_db(self, dbc=None):
+        """Проверяет, есть ли книга в таблице books БД harold
+
+        dbc - подключение к БД; по умолчанию общее для процесса, поэтому проверка
+        книг библиотеки (см. parser.fiction_book.iter_catalogue) не создает подключение на каждую книгу
+        """
+        if dbc is None:
+            dbc = get_connection()
+        return dbc.exists(Book, self.book_code_name)
+
+    def save_book_info_to_db(self):
+        """
+        Сохраняет информацию об обработанной книге и авторе в БД harold
+        """
+        dbc = DataBaseConnection()
+        _author_id = dbc.get_id(Author, code_name=self.author_code_name)
+        _book_id = dbc.get_id(Book, code_name=self.book_code_name)
+
+        author = Author(id=_author_id,
+                        name=self.book_info['author'],
+                        code_name=self.author_code_name
+                        )
+
+        book = Book(id=_book_id,
+                    title=self.book_info['title'],
+                    author_id=_author_id,
+                    genre=','.join(self.book_info['genres']),
+                    date=self.book_info['date'],
+                    code_name=self.book_code_name
+                    )
+
+        _author_id = dbc.create_or_update(author)
+        _book_id = dbc.create_or_update(book)
+        dbc.close_session()
+        return _book_id, _author_id